@@ -0,0 +1,228 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+
+from market.cache import CacheDisco, directorio_cache, limite_por_defecto, publicar_carpeta
+
+
+def columna_fecha(df):
+    """Devuelve la columna temporal del DataFrame ('Date' en diario, 'Datetime' en intradía)."""
+    return df['Date'] if 'Date' in df.columns else df['Datetime']
+
+def fechas_locales(df):
+    """Fechas de las velas sin zona horaria, para compararlas con fechas 'YYYY-MM-DD'."""
+    fechas = pd.to_datetime(columna_fecha(df))
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_localize(None)
+    return fechas
+
+def dia(fecha):
+    return pd.Timestamp(fecha).strftime("%Y-%m-%d")
+
+
+class AlmacenIncremental:
+    """
+    Almacén de velas con un fichero por (símbolo, intervalo).
+    Cada fichero guarda las velas y el rango [inicio, fin) ya cubierto, de modo que en cada
+    ejecución solo se descargan los tramos que faltan y se fusionan con lo que ya había.
+    Los ficheros son entradas de una CacheDisco (checksum, escritura atómica y expulsión LRU
+    bajo presupuesto): una entrada expulsada o corrupta solo obliga a volver a descargarla.
+    Cada entrada se lee una vez por ejecución (leer) y se pasa a pendientes, fusionar y tramo.
+    """
+    def __init__(self, directorio=None, limite_bytes=None):
+        self.directorio = directorio or os.path.join(directorio_cache(), "velas")
+        self.cache = CacheDisco(self.directorio, limite_bytes=limite_bytes or limite_por_defecto())
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _clave(symbol, intervalo):
+        nombre = str(symbol).replace(os.sep, "_").replace("/", "_")
+        return f"{intervalo}_{nombre}"
+
+    def leer(self, symbol, intervalo):
+        """Devuelve {"inicio", "fin", "df"} o None si el símbolo no está en el almacén."""
+        _, entrada = self.cache.leer(self._clave(symbol, intervalo))
+        return entrada
+
+    def _escribir(self, symbol, intervalo, entrada):
+        self.cache.escribir(self._clave(symbol, intervalo), entrada)
+
+    def estadisticas(self):
+        return self.cache.estadisticas()
+
+    @staticmethod
+    def pendientes(entrada, inicio, fin):
+        """Tramos (inicio, fin) que faltan por descargar para cubrir [inicio, fin) dada la entrada leída."""
+        if entrada is None:
+            return [(dia(inicio), dia(fin))]
+        tramos = []
+        if pd.Timestamp(inicio) < pd.Timestamp(entrada["inicio"]):
+            tramos.append((dia(inicio), entrada["inicio"]))
+        if pd.Timestamp(entrada["fin"]) < pd.Timestamp(fin):
+            tramos.append((entrada["fin"], dia(fin)))
+        return tramos
+
+    def fusionar(self, symbol, intervalo, entrada, df, inicio, fin):
+        """
+        Añade a `entrada` (la leída al empezar, o None) las velas nuevas de [inicio, fin), la
+        guarda y devuelve la entrada resultante. Las velas repetidas se sustituyen por las nuevas.
+        El fin cubierto se deja en la fecha de la última vela, para que una vela aún abierta
+        (la del día en curso) se vuelva a pedir en la siguiente ejecución. Sin velas nuevas no
+        se toca nada: el tramo sigue pendiente y se vuelve a pedir.
+        """
+        if df is None or df.empty:
+            return entrada
+        pedido = pd.Timestamp(inicio)
+        if entrada is not None:
+            partes = [d for d in (entrada["df"], df) if d is not None and not d.empty]
+            df = pd.concat(partes, ignore_index=True)
+            inicio = min(pd.Timestamp(inicio), pd.Timestamp(entrada["inicio"]))
+            fin = max(pd.Timestamp(fin), pd.Timestamp(entrada["fin"]))
+        clave = columna_fecha(df).name
+        df = df.drop_duplicates(subset=clave, keep="last").sort_values(clave).reset_index(drop=True)
+        ultima = fechas_locales(df).iloc[-1].normalize()
+        if ultima >= pedido:
+            fin = min(pd.Timestamp(fin), ultima)
+        entrada = {"inicio": dia(inicio), "fin": dia(fin), "df": df}
+        with self.lock:
+            self._escribir(symbol, intervalo, entrada)
+        return entrada
+
+    @staticmethod
+    def tramo(entrada, inicio, fin):
+        """Velas de [inicio, fin) de la entrada, o None."""
+        if entrada is None or entrada["df"] is None or entrada["df"].empty:
+            return None
+        df = entrada["df"]
+        fechas = fechas_locales(df)
+        df = df[(fechas >= pd.Timestamp(inicio)) & (fechas < pd.Timestamp(fin))]
+        return df.reset_index(drop=True) if not df.empty else None
+
+
+CAMPOS_PANEL = ("open", "close", "high", "low", "volume")
+
+class AlmacenPaneles:
+    """
+    Guarda el panel ya limpio de un Source como ficheros .npy (uno por campo, más el eje de
+    fechas y la máscara de velas válidas) que se cargan mapeados en memoria. Un arranque sin
+    velas nuevas no limpia ni alinea nada y varios procesos de simulación comparten las mismas
+    páginas. La clave es el universo pedido (símbolos, inicio e intervalo) más la última vela de
+    cada símbolo con datos, y solo se conserva el último panel de cada universo. Por encima de `limite_bytes`
+    se expulsan los paneles menos usados. No llevan checksum (habría que leerlos enteros en
+    cada arranque): un panel solo es visible cuando está completo, porque se publica con os.replace.
+    """
+    def __init__(self, directorio=None, limite_bytes=None):
+        self.directorio = directorio or os.path.join(directorio_cache(), "paneles")
+        self.limite_bytes = limite_bytes or limite_por_defecto()
+        self.stats = {"hits": 0, "misses": 0, "expulsados": 0, "bytes_escritos": 0}
+
+    @staticmethod
+    def universo(symbols, fecha_inicio, intervalo):
+        datos = json.dumps([list(map(str, symbols)), str(fecha_inicio), intervalo])
+        return hashlib.md5(datos.encode("utf-8")).hexdigest()
+
+    def clave(self, symbols, fecha_inicio, intervalo, ultimas):
+        """
+        <universo>-<velas>: `ultimas` es {símbolo con datos: fecha de su última vela}. Las velas
+        van aparte para reconocer los paneles del mismo universo.
+        """
+        velas = json.dumps(sorted((str(s), str(f)) for s, f in ultimas.items()))
+        return f"{self.universo(symbols, fecha_inicio, intervalo)}-{hashlib.md5(velas.encode('utf-8')).hexdigest()[:16]}"
+
+    def cargar(self, clave):
+        """Devuelve un dict con symbols, fechas_ns, valido y panel_<campo> (mmap), o None."""
+        carpeta = os.path.join(self.directorio, clave)
+        if not os.path.exists(os.path.join(carpeta, "symbols.json")):
+            self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(carpeta)  # último uso, para la expulsión LRU
+        except OSError:
+            pass
+        with open(os.path.join(carpeta, "symbols.json"), "r", encoding="utf-8") as f:
+            panel = {"symbols": json.load(f)}
+        try:
+            for nombre in ("fechas_ns", "valido") + tuple("panel_" + c for c in CAMPOS_PANEL):
+                panel[nombre] = np.load(os.path.join(carpeta, nombre + ".npy"), mmap_mode="r")
+        except OSError:
+            # Panel de una versión con menos campos: se reconstruye
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return panel
+
+    def guardar(self, clave, source):
+        carpeta = os.path.join(self.directorio, clave)
+
+        def escribir(temporal):
+            for nombre in ("fechas_ns", "valido") + tuple("panel_" + c for c in CAMPOS_PANEL):
+                np.save(os.path.join(temporal, nombre + ".npy"), np.asarray(getattr(source, nombre)))
+            # symbols.json se escribe el último: marca el panel como completo
+            with open(os.path.join(temporal, "symbols.json"), "w", encoding="utf-8") as f:
+                json.dump(list(map(str, source.symbols)), f)
+
+        publicar_carpeta(carpeta, escribir)
+        self.stats["bytes_escritos"] += self._tamano_carpeta(carpeta)
+        self._podar(clave)
+        if self.tamano() > self.limite_bytes:
+            self.expulsar(conservar=clave)
+
+    def _podar(self, clave):
+        """Borra los paneles anteriores del mismo universo (no los temporales de otros procesos)."""
+        prefijo = clave.split("-", 1)[0] + "-"
+        for nombre in os.listdir(self.directorio):
+            if nombre.startswith(prefijo) and nombre != clave and not nombre.endswith(".tmp"):
+                # En POSIX quien lo tenga mapeado conserva sus páginas hasta cerrarlo
+                shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+
+    @staticmethod
+    def _tamano_carpeta(carpeta):
+        total = 0
+        for nombre in os.listdir(carpeta) if os.path.isdir(carpeta) else ():
+            try:
+                total += os.path.getsize(os.path.join(carpeta, nombre))
+            except OSError:
+                pass
+        return total
+
+    def _entradas(self):
+        """(último uso, bytes, clave) de cada panel completo."""
+        entradas = []
+        if not os.path.isdir(self.directorio):
+            return entradas
+        for nombre in os.listdir(self.directorio):
+            carpeta = os.path.join(self.directorio, nombre)
+            if nombre.endswith(".tmp") or not os.path.isdir(carpeta):
+                continue
+            try:
+                uso = os.stat(carpeta).st_mtime
+            except OSError:
+                continue
+            entradas.append((uso, self._tamano_carpeta(carpeta), nombre))
+        return entradas
+
+    def tamano(self):
+        return sum(tam for _, tam, _ in self._entradas())
+
+    def expulsar(self, conservar=None):
+        """Borra los paneles menos usados hasta caber en el presupuesto (nunca `conservar`)."""
+        entradas = sorted(self._entradas())
+        total = sum(tam for _, tam, _ in entradas)
+        for _, tam, nombre in entradas:
+            if total <= self.limite_bytes:
+                break
+            if nombre == conservar:
+                continue
+            shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+            total -= tam
+            self.stats["expulsados"] += 1
+
+    def estadisticas(self):
+        stats = dict(self.stats)
+        stats["bytes_en_disco"] = self.tamano()
+        return stats
@@ -0,0 +1,104 @@
+import numpy as np
+
+from market.simulator import acciones as calcularAcciones, comprobarDesborde
+from market.comisiones import ComisionPorAccion, COMISION_LEGADA, volumen_mensual
+
+
+def matrices_ordenes(ordenes, size):
+    """
+    Convierte un flujo de órdenes grabado (una respuesta de StrategyClient.open por día,
+    {"programBuy": [...], "programSell": [...]}) en matrices (días x símbolos):
+    pBuy, amountBuy, pSell, amountSell. Si un símbolo tiene dos órdenes del mismo lado
+    en un día gana la última, igual que en el libro de órdenes de Simulator.
+    """
+    dias = len(ordenes)
+    pBuy = np.zeros((dias, size))
+    pSell = np.zeros((dias, size))
+    amountBuy = np.zeros((dias, size))
+    amountSell = np.zeros((dias, size))
+    for t, orders in enumerate(ordenes):
+        for order in orders.get("programBuy", []):
+            pBuy[t, order["id"]] = order["price"]
+            amountBuy[t, order["id"]] = order["amount"]
+        for order in orders.get("programSell", []):
+            pSell[t, order["id"]] = order["price"]
+            amountSell[t, order["id"]] = order["amount"]
+    return pBuy, amountBuy, pSell, amountSell
+
+
+def backtest_matricial(pBuy, amountBuy, pSell, amountSell, low, high, close, money,
+                       comisionFija=COMISION_LEGADA, tipoPosicion=np.int64, symbols=None,
+                       volume=None, participacion=None, costes=None, fechas=None):
+    """
+    Ejecuta de una vez todo un flujo de órdenes límite de día sobre el panel OHLC, con las
+    mismas reglas que Simulator.execute día a día. Todas las matrices son (días x símbolos).
+
+    - Compra si low < pBuy < high: amountBuy/pBuy acciones al precio límite, enteras salvo que
+      tipoPosicion sea float (fraccionarias). Con enteros se lanza OverflowError si no caben.
+    - Venta si low < pSell < high: amountSell/pSell acciones (redondeadas si son enteras) al
+      precio límite, como mucho la posición tras las compras del día.
+    - Con volume y participacion cada orden se ejecuta como mucho por participacion*volumen.
+    - Coste según el modelo `costes` (market.comisiones), por defecto comisionFija por acción
+      comprada y vendida. Los modelos escalonados por volumen mensual necesitan `fechas`
+      (una por día); sin ellas todo el backtest cuenta como el primer tramo.
+
+    La única dependencia secuencial es la posición, P_t = max(0, P_{t-1} + compras - ventas):
+    es la recursión de Lindley, que se resuelve sin bucle como S_t - min(0, min_{u<=t} S_u)
+    con S la suma acumulada de compras menos ventas pedidas. La caja es la suma acumulada
+    de los flujos de cada día, porque, como en Simulator, no limita las compras.
+
+    Devuelve un dict con arrays por día: tasacion, money, comision, posiciones (días x símbolos),
+    compras y ventas (máscaras de ejecución) y las acciones compradas y vendidas.
+    """
+    pBuy, amountBuy, pSell, amountSell = (np.asarray(m, dtype=np.float64) for m in (pBuy, amountBuy, pSell, amountSell))
+    low, high, close = (np.asarray(m, dtype=np.float64) for m in (low, high, close))
+    dias, size = close.shape
+    entero = np.issubdtype(np.dtype(tipoPosicion), np.integer)
+
+    compras = (amountBuy > 0) & (low < pBuy) & (pBuy < high)
+    acciones = calcularAcciones(compras, amountBuy, pBuy, entero)
+    pedidas = calcularAcciones((amountSell > 0) & (pSell > 0), amountSell, pSell, False)
+    if entero:
+        pedidas = np.round(pedidas)
+    ventas = (pedidas > 0) & (low < pSell) & (pSell < high)
+    pedidas = np.where(ventas, pedidas, 0)
+    if volume is not None and participacion is not None:
+        maximo = participacion * np.asarray(volume, dtype=np.float64)
+        maximo = np.where(np.isnan(maximo), np.inf, maximo)  # sin dato de volumen no se limita
+        if entero:
+            maximo = np.floor(maximo)
+        acciones = np.minimum(acciones, maximo)
+        pedidas = np.minimum(pedidas, maximo)
+
+    # Recursión de Lindley sobre la suma acumulada de compras menos ventas pedidas
+    suma = np.cumsum(acciones - pedidas, axis=0)
+    posiciones = suma - np.minimum(np.minimum.accumulate(suma, axis=0), 0)
+    anteriores = np.vstack([np.zeros((1, size)), posiciones[:-1]])
+    vendidas = anteriores + acciones - posiciones
+    if entero:
+        # La mayor posición de cada símbolo alcanzada en algún día
+        comprobarDesborde(np.zeros(size, dtype=tipoPosicion), posiciones.max(axis=0, initial=0),
+                          symbols if symbols is not None else [str(i) for i in range(size)])
+    posiciones = posiciones.astype(tipoPosicion)
+    acciones = acciones.astype(tipoPosicion)
+    vendidas = vendidas.astype(tipoPosicion)
+
+    coste = np.sum(acciones * pBuy, axis=1)
+    ingresos = np.sum(vendidas * pSell, axis=1)
+    costes = costes if costes is not None else ComisionPorAccion(comisionFija)
+    volumenMes = volumen_mensual(fechas, acciones + vendidas) if fechas is not None else np.zeros(dias)
+    comision = np.sum(costes.coste(acciones, pBuy, low, high, volumenMes)
+                      + costes.coste(vendidas, pSell, low, high, volumenMes), axis=1)
+    caja = money + np.cumsum(ingresos - coste - comision)
+    tasacion = caja + np.sum(posiciones * close, axis=1)
+
+    return {
+        "tasacion": tasacion,
+        "money": caja,
+        "comision": comision,
+        "posiciones": posiciones,
+        "acciones": acciones,
+        "vendidas": vendidas,
+        "compras": compras,
+        "ventas": ventas,
+    }
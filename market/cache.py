@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import inspect
+import pickle
+import hashlib
+import shutil
+import functools
+import threading
+
+
+def directorio_cache():
+    """
+    Carpeta estable de la caché: PYROBOADVISOR_CACHE si está definida, si no ~/.cache/pyroboadvisor.
+    No depende del directorio desde el que se lance el programa.
+    """
+    return os.environ.get("PYROBOADVISOR_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "pyroboadvisor")
+
+def escribir_atomico(ruta, datos):
+    """Escribe en un temporal de la misma carpeta y lo renombra: nunca queda un fichero a medias."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporal, "wb") as f:
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+def publicar_carpeta(carpeta, escribir, sustituir=True):
+    """
+    Como escribir_atomico para una carpeta de ficheros: escribir(temporal) la rellena en una
+    carpeta temporal junto a la final y después se publica con os.replace, así nunca se ve a
+    medias ni se reescribe un fichero que otro proceso tenga mapeado. Si ya existía se sustituye,
+    salvo con sustituir=False (carpetas por contenido: la que ya está vale igual).
+    """
+    temporal = f"{carpeta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    try:
+        escribir(temporal)
+        if sustituir:
+            shutil.rmtree(carpeta, ignore_errors=True)
+        try:
+            os.replace(temporal, carpeta)
+        except OSError:
+            pass  # otro proceso la publicó a la vez; vale cualquiera de las dos
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+CABECERA = b"PYROCACHE1"
+
+class CacheDisco:
+    """
+    Caché en disco gestionada: un fichero por clave con cabecera
+    (marca, sha256 del contenido, fecha de creación), escritura atómica,
+    expulsión LRU bajo un presupuesto de bytes y caducidad por edad.
+    Los ficheros sin cabecera o con checksum incorrecto se descartan y se borran.
+    """
+    def __init__(self, directorio=None, limite_bytes=2 * 1024 ** 3, max_edad=None):
+        """
+        limite_bytes: tamaño máximo de la carpeta; al superarlo se borran las entradas menos usadas.
+        max_edad: segundos; una entrada más antigua cuenta como fallo y se expulsa.
+        """
+        self.directorio = directorio or os.path.join(directorio_cache(), "llamadas")
+        self.limite_bytes = limite_bytes
+        self.max_edad = max_edad
+        self.lock = threading.Lock()
+        self.total_bytes = None  # se calcula al primer uso
+        self.stats = {"hits": 0, "misses": 0, "corruptos": 0, "caducados": 0, "expulsados": 0,
+                      "bytes_leidos": 0, "bytes_escritos": 0}
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pkl")
+
+    def _contar(self, nombre, n=1):
+        with self.lock:
+            self.stats[nombre] += n
+
+    def _borrar(self, ruta):
+        try:
+            tam = os.path.getsize(ruta)
+            os.remove(ruta)
+        except OSError:
+            return
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes -= tam
+
+    def leer(self, clave, max_edad=None):
+        """Devuelve (True, valor) si hay una entrada válida, o (False, None)."""
+        ruta = self._ruta(clave)
+        max_edad = max_edad if max_edad is not None else self.max_edad
+        try:
+            with open(ruta, "rb") as f:
+                datos = f.read()
+        except OSError:
+            self._contar("misses")
+            return False, None
+
+        cabecera, _, contenido = datos.partition(b"\n")
+        partes = cabecera.split(b" ")
+        if len(partes) != 3 or partes[0] != CABECERA or hashlib.sha256(contenido).hexdigest().encode() != partes[1]:
+            self._contar("corruptos")
+            self._contar("misses")
+            self._borrar(ruta)
+            return False, None
+        if max_edad is not None and time.time() - float(partes[2]) > max_edad:
+            self._contar("caducados")
+            self._contar("misses")
+            self._borrar(ruta)
+            return False, None
+
+        try:
+            valor = pickle.loads(contenido)
+        except Exception:
+            self._contar("corruptos")
+            self._contar("misses")
+            self._borrar(ruta)
+            return False, None
+        # La fecha de modificación hace de último uso para la expulsión LRU
+        try:
+            os.utime(ruta)
+        except OSError:
+            pass
+        self._contar("hits")
+        self._contar("bytes_leidos", len(datos))
+        return True, valor
+
+    def escribir(self, clave, valor):
+        contenido = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        cabecera = b" ".join([CABECERA, hashlib.sha256(contenido).hexdigest().encode(), repr(time.time()).encode()])
+        datos = cabecera + b"\n" + contenido
+        ruta = self._ruta(clave)
+        anterior = os.path.getsize(ruta) if os.path.exists(ruta) else 0
+        escribir_atomico(ruta, datos)
+        self._contar("bytes_escritos", len(datos))
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes += len(datos) - anterior
+        if self.tamano() > self.limite_bytes:
+            self.expulsar()
+
+    def _entradas(self):
+        entradas = []
+        if not os.path.isdir(self.directorio):
+            return entradas
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith(".pkl"):
+                continue
+            ruta = os.path.join(self.directorio, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            entradas.append((st.st_mtime, st.st_size, ruta))
+        return entradas
+
+    def tamano(self):
+        with self.lock:
+            if self.total_bytes is None:
+                self.total_bytes = sum(tam for _, tam, _ in self._entradas())
+            return self.total_bytes
+
+    def expulsar(self):
+        """Borra las entradas sin usar desde hace más de max_edad y, después, las menos usadas hasta caber en el presupuesto."""
+        entradas = sorted(self._entradas())
+        total = sum(tam for _, tam, _ in entradas)
+        ahora = time.time()
+        for uso, tam, ruta in entradas:
+            caducada = self.max_edad is not None and ahora - uso > self.max_edad
+            if not caducada and total <= self.limite_bytes:
+                continue
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tam
+            self._contar("expulsados")
+        with self.lock:
+            self.total_bytes = total
+
+    def estadisticas(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["bytes_en_disco"] = self.tamano()
+        return stats
+
+
+def limite_por_defecto():
+    """Presupuesto en bytes de cada carpeta de la caché (llamadas, velas, paneles): PYROBOADVISOR_CACHE_MAX_BYTES o 2 GiB."""
+    return int(os.environ.get("PYROBOADVISOR_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+
+_cache_por_defecto = None
+
+def cache_por_defecto():
+    """CacheDisco compartida por disk_cache."""
+    global _cache_por_defecto
+    if _cache_por_defecto is None:
+        _cache_por_defecto = CacheDisco(limite_bytes=limite_por_defecto())
+    return _cache_por_defecto
+
+
+def _canonico(valor):
+    """Representación estable (JSON) de un argumento, independiente del proceso."""
+    if valor is None or isinstance(valor, (bool, int, float, str)):
+        return valor
+    if isinstance(valor, dict):
+        return {"dict": sorted(([_canonico(k), _canonico(v)] for k, v in valor.items()), key=json.dumps)}
+    if isinstance(valor, (list, tuple)):
+        return [_canonico(v) for v in valor]
+    if isinstance(valor, (set, frozenset)):
+        return {"set": sorted(json.dumps(_canonico(v)) for v in valor)}
+    if hasattr(valor, "isoformat"):
+        return {"fecha": valor.isoformat()}
+    if hasattr(valor, "tobytes") and hasattr(valor, "dtype"):
+        return {"array": [str(valor.dtype), list(getattr(valor, "shape", ())), hashlib.sha256(valor.tobytes()).hexdigest()]}
+    if hasattr(valor, "clave_cache"):
+        return {"objeto": _canonico(valor.clave_cache())}
+    return {"repr": repr(valor)}
+
+def clave_cache(func, args, kwargs, version=None):
+    """
+    Clave canónica de una llamada: nombre cualificado de la función, todos sus argumentos
+    (posicionales o por nombre, con los valores por defecto aplicados) y la versión indicada.
+    Si el primer argumento es `self`, la instancia cuenta por su clave_cache() si la define
+    o, si no, por su clase: el resultado no puede depender de id(self).
+    """
+    ligados = inspect.signature(func).bind(*args, **kwargs)
+    ligados.apply_defaults()
+    argumentos = dict(ligados.arguments)
+    if "self" in argumentos:
+        instancia = argumentos["self"]
+        if hasattr(instancia, "clave_cache"):
+            argumentos["self"] = instancia.clave_cache()
+        else:
+            argumentos["self"] = type(instancia).__module__ + "." + type(instancia).__qualname__
+    if callable(version):
+        version = version()
+    datos = [func.__module__, func.__qualname__, version, _canonico(argumentos)]
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode("utf-8")).hexdigest()
+
+def disk_cache(func=None, cache=None, max_edad=None, version=None):
+    """
+    Cachea en disco el resultado de la función. Se usa como @disk_cache o
+    @disk_cache(cache=CacheDisco(...), max_edad=segundos, version=...).
+    version: cadena o función que la devuelve (p. ej. la versión de yfinance); forma parte de la clave.
+    """
+    if func is None:
+        return functools.partial(disk_cache, cache=cache, max_edad=max_edad, version=version)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        gestor = cache or cache_por_defecto()
+        key = clave_cache(func, args, kwargs, version)
+
+        hit, result = gestor.leer(key, max_edad=max_edad)
+        if hit:
+            return result
+
+        result = func(*args, **kwargs)
+        gestor.escribir(key, result)
+        return result
+
+    return wrapper
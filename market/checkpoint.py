@@ -0,0 +1,32 @@
+import io
+import os
+
+import numpy as np
+
+from market.cache import escribir_atomico
+
+
+def guardar_checkpoint(ruta, **partes):
+    """
+    Guarda varias partes de estado (dicts de arrays, p. ej. simulator.estado() y sp.estado())
+    en un único .npz comprimido. La escritura es atómica: un fallo a mitad deja el anterior.
+    """
+    arrays = {}
+    for parte, estado in partes.items():
+        for clave, valor in estado.items():
+            arrays[f"{parte}.{clave}"] = np.asarray(valor)
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    escribir_atomico(ruta, buffer.getvalue())
+
+
+def cargar_checkpoint(ruta):
+    """Devuelve {parte: {clave: array}} o None si no hay checkpoint."""
+    if not os.path.exists(ruta):
+        return None
+    partes = {}
+    with np.load(ruta, allow_pickle=False) as datos:
+        for nombre in datos.files:
+            parte, clave = nombre.split(".", 1)
+            partes.setdefault(parte, {})[clave] = datos[nombre]
+    return partes
@@ -0,0 +1,103 @@
+import numpy as np
+
+COMISION_LEGADA = 0.0035+(0.000166+0.000022)-0.002
+
+
+class ModeloCoste:
+    """
+    Coste de las ejecuciones de una barra. coste() recibe arrays con la forma del libro
+    (símbolos, o carteras x símbolos, o días x símbolos en el backtest) con las acciones
+    ejecutadas, su precio y el low/high de la barra, y devuelve el coste de cada ejecución
+    con esa misma forma. volumenMes son las acciones ya ejecutadas en el mes antes de la
+    barra (escalar o un valor por cartera/día); solo lo usan los modelos escalonados.
+    """
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        return np.zeros(np.shape(acciones))
+
+    def __add__(self, otro):
+        return CosteCompuesto(self, otro)
+
+
+class CosteCompuesto(ModeloCoste):
+    """Suma de varios modelos: p. ej. comisión del bróker más deslizamiento."""
+    def __init__(self, *modelos):
+        self.modelos = modelos
+
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        return sum(modelo.coste(acciones, precio, low, high, volumenMes) for modelo in self.modelos)
+
+
+class ComisionPorAccion(ModeloCoste):
+    """Importe fijo por acción, el modelo clásico del simulador."""
+    def __init__(self, porAccion=COMISION_LEGADA):
+        self.porAccion = porAccion
+
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        return acciones*self.porAccion
+
+
+class ComisionIBEscalonada(ModeloCoste):
+    """
+    Tarifa escalonada de IB para acciones de EE. UU.: precio por acción según el volumen
+    mensual acumulado, con un mínimo por orden y un máximo en porcentaje del nominal.
+    `tasas` se suma por acción fuera del mínimo/máximo (tasas de bolsa y reguladores).
+    El tramo se decide con el volumen previo a la barra para todas sus ejecuciones.
+    """
+    TRAMOS = ((300_000, 0.0035), (3_000_000, 0.002), (20_000_000, 0.0015), (100_000_000, 0.001), (np.inf, 0.0005))
+
+    def __init__(self, tramos=TRAMOS, minimo=0.35, maximo=0.01, tasas=0.0):
+        self.limites = np.array([limite for limite, _ in tramos], dtype=np.float64)
+        self.precios = np.array([precio for _, precio in tramos], dtype=np.float64)
+        self.minimo = minimo
+        self.maximo = maximo
+        self.tasas = tasas
+
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        tramo = np.searchsorted(self.limites, np.asarray(volumenMes, dtype=np.float64))
+        porAccion = self.precios[np.minimum(tramo, self.precios.size - 1)]
+        base = acciones*np.expand_dims(porAccion, -1)
+        base = np.minimum(np.maximum(base, self.minimo), self.maximo*acciones*precio)
+        return np.where(acciones > 0, base + acciones*self.tasas, 0)
+
+
+class ComisionPorcentaje(ModeloCoste):
+    """Porcentaje del nominal ejecutado, con un mínimo opcional por orden."""
+    def __init__(self, porcentaje=0.001, minimo=0.0):
+        self.porcentaje = porcentaje
+        self.minimo = minimo
+
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        return np.where(acciones > 0, np.maximum(acciones*precio*self.porcentaje, self.minimo), 0)
+
+
+class DeslizamientoSpread(ModeloCoste):
+    """
+    Deslizamiento estimado con el rango de la barra: cada acción paga `fraccion` de high-low.
+    Se cobra como coste; el precio de ejecución sigue siendo el límite.
+    """
+    def __init__(self, fraccion=0.05):
+        self.fraccion = fraccion
+
+    def coste(self, acciones, precio, low, high, volumenMes=0):
+        return acciones*self.fraccion*(np.asarray(high) - np.asarray(low))
+
+
+MODELOS = {
+    "accion": ComisionPorAccion,
+    "ib": ComisionIBEscalonada,
+    "porcentaje": ComisionPorcentaje,
+    "spread": DeslizamientoSpread,
+}
+
+
+def volumen_mensual(fechas, acciones):
+    """
+    Acciones ejecutadas en el mes antes de cada día, para backtests matriciales.
+    fechas: fechas de los días (ns o datetime64); acciones: (días x ...) ejecutadas por día.
+    """
+    diario = np.asarray(acciones, dtype=np.float64).reshape(len(fechas), -1).sum(axis=1)
+    meses = np.asarray(fechas).astype("datetime64[ns]").astype("datetime64[M]")
+    acumulado = np.cumsum(diario) - diario
+    inicio = np.r_[True, meses[1:] != meses[:-1]]
+    # Se resta lo acumulado al empezar cada mes
+    return acumulado - np.maximum.accumulate(np.where(inicio, acumulado, 0))
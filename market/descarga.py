@@ -0,0 +1,172 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+
+import numpy as np
+import pandas as pd
+
+
+class LimitadorTasa:
+    """Cubo de fichas: como mucho `por_segundo` peticiones por segundo, con ráfagas de `rafaga`."""
+    def __init__(self, por_segundo, rafaga=1):
+        self.por_segundo = por_segundo
+        self.rafaga = rafaga
+        self.fichas = rafaga
+        self.ultimo = time.monotonic()
+        self.lock = threading.Lock()
+
+    def esperar(self):
+        while True:
+            with self.lock:
+                ahora = time.monotonic()
+                self.fichas = min(self.rafaga, self.fichas + (ahora - self.ultimo) * self.por_segundo)
+                self.ultimo = ahora
+                if self.fichas >= 1:
+                    self.fichas -= 1
+                    return
+                falta = (1 - self.fichas) / self.por_segundo
+            time.sleep(falta)
+
+
+# Un limitador por host, compartido por todas las descargas del proceso
+_limitadores = {}
+_lock_limitadores = threading.Lock()
+
+def limitador_host(host, por_segundo, rafaga=1):
+    with _lock_limitadores:
+        if host not in _limitadores:
+            _limitadores[host] = LimitadorTasa(por_segundo, rafaga)
+        return _limitadores[host]
+
+
+def separar_por_instrumento(df, instrumentos):
+    """
+    Separa el DataFrame de una descarga por lotes (columnas (ticker, campo))
+    en un DataFrame por instrumento, descartando las filas vacías.
+    """
+    if df is None or df.empty:
+        return {}
+    if not isinstance(df.columns, pd.MultiIndex):
+        return {instrumentos[0]: df} if len(instrumentos) == 1 else {}
+    nivel = 0 if set(instrumentos) & set(df.columns.get_level_values(0)) else 1
+    presentes = set(df.columns.get_level_values(nivel))
+    resultado = {}
+    for instrumento in instrumentos:
+        if instrumento not in presentes:
+            continue
+        sub = df.xs(instrumento, axis=1, level=nivel).dropna(how="all")
+        if not sub.empty:
+            resultado[instrumento] = sub
+    return resultado
+
+
+class DescargaParalela:
+    """
+    Reparte (lote de instrumentos x bloque de fechas) en un pool acotado de hilos.
+    `descargar(instrumentos, inicio, fin, intervalo)` debe devolver un DataFrame como el de
+    yf.download con group_by="ticker"; se puede sustituir por un stub local para pruebas.
+    """
+    def __init__(self, descargar, lote=50, hilos=8, host="finance.yahoo.com", peticiones_por_segundo=2,
+                 reintentos=3, espera=1.0, informar=print):
+        self.descargar = descargar
+        self.lote = lote
+        self.hilos = hilos
+        self.limitador = limitador_host(host, peticiones_por_segundo, rafaga=hilos)
+        self.reintentos = reintentos
+        self.espera = espera
+        self.informar = informar
+        self.fallidos = []  # (instrumentos, bloque, error)
+
+    def _con_reintentos(self, instrumentos, bloque, intervalo):
+        """
+        Descarga el lote y vuelve a pedir, con backoff, solo los instrumentos que no han venido
+        (por un error o porque la respuesta no los trae). Devuelve ({instrumento: DataFrame},
+        instrumentos que siguen sin datos, último error).
+        """
+        resultado = {}
+        faltan = list(instrumentos)
+        error = "sin datos"
+        for intento in range(self.reintentos + 1):
+            if intento:
+                # Backoff exponencial con algo de ruido para no sincronizar los hilos
+                time.sleep(self.espera * 2 ** (intento - 1) * (1 + random.random()))
+            self.limitador.esperar()
+            try:
+                df = self.descargar(faltan, bloque[0], bloque[1], intervalo)
+            except Exception as e:
+                error = e
+                continue
+            resultado.update(separar_por_instrumento(df, faltan))
+            faltan = [i for i in faltan if i not in resultado]
+            if not faltan:
+                break
+            error = "sin datos"
+        return resultado, faltan, error
+
+    def ejecutar(self, instrumentos, bloques, intervalo):
+        """
+        Devuelve {instrumento: [DataFrame por bloque, en orden de bloques]}. Los instrumentos
+        que tras los reintentos siguen sin datos en un bloque quedan en `fallidos`.
+        """
+        lotes = [list(instrumentos[i:i + self.lote]) for i in range(0, len(instrumentos), self.lote)]
+        tareas = [(lote, j, bloque) for lote in lotes for j, bloque in enumerate(bloques)]
+        partes = {}
+        self.fallidos = []
+        hechas = 0
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            futuros = {pool.submit(self._con_reintentos, lote, bloque, intervalo): (lote, j, bloque)
+                       for lote, j, bloque in tareas}
+            for futuro in as_completed(futuros):
+                lote, j, bloque = futuros[futuro]
+                hechas += 1
+                try:
+                    separados, faltan, error = futuro.result()
+                except Exception as e:
+                    separados, faltan, error = {}, lote, e
+                for instrumento, df in separados.items():
+                    partes.setdefault(instrumento, {})[j] = df
+                if faltan:
+                    self.fallidos.append((faltan, bloque, error))
+                self.informar(f"📥 {hechas}/{len(tareas)} lotes descargados ({len(self.fallidos)} fallidos) con intervalo {intervalo}")
+
+        for lote, bloque, error in self.fallidos:
+            self.informar(f"❌ Lote {lote[0]}..{lote[-1]} ({len(lote)}) {bloque[0]} - {bloque[1]}: {error}")
+        return {instrumento: [dfs[j] for j in sorted(dfs)] for instrumento, dfs in partes.items()}
+
+
+def cotizar(symbols, obtener, hilos=16, timeout=10, informar=print):
+    """
+    Pide el precio de todos los símbolos a la vez con un pool acotado de hilos.
+    `obtener(symbol, timeout)` devuelve el precio o None. El resultado es un vector alineado
+    con `symbols`, con 0 donde no hay precio (fallo, sin datos o fuera de plazo).
+    """
+    precios = np.zeros(len(symbols), dtype=np.float64)
+    fallidos = []
+    pool = ThreadPoolExecutor(max_workers=hilos)
+    try:
+        futuros = {pool.submit(obtener, symbol, timeout): i for i, symbol in enumerate(symbols)}
+        # Plazo total: cada petición tiene su timeout, pero se acota también el conjunto
+        plazo = timeout * (len(symbols) / hilos + 1)
+        hechos, pendientes = wait(futuros, timeout=plazo)
+        for futuro in hechos:
+            i = futuros[futuro]
+            try:
+                precio = futuro.result()
+            except Exception as error:
+                fallidos.append(f"{symbols[i]} ({error})")
+                continue
+            if precio is None or not np.isfinite(precio):
+                fallidos.append(symbols[i])
+            else:
+                precios[i] = precio
+        for futuro in pendientes:
+            futuro.cancel()
+            fallidos.append(f"{symbols[futuros[futuro]]} (timeout)")
+    finally:
+        pool.shutdown(wait=False)
+
+    informar(f"📈 Precios obtenidos: {len(symbols) - len(fallidos)}/{len(symbols)}")
+    if fallidos:
+        informar(f"⚠️ No se obtuvo precio para: {', '.join(fallidos)}")
+    return precios
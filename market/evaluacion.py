@@ -2,6 +2,22 @@ from datetime import datetime, date, timedelta
 import pandas as pd
 import matplotlib.pyplot as plt
 
+from market.cache import disk_cache
+
+
+def _version_yfinance():
+    try:
+        import yfinance as yf
+        return yf.__version__
+    except ImportError:
+        return None
+
+@disk_cache(max_edad=12 * 3600, version=_version_yfinance)
+def descargar_indice(ticker, start, end):
+    """Cotización diaria del índice de referencia, cacheada en disco."""
+    import yfinance as yf
+    return yf.download(ticker, start=start, end=end, progress=False)
+
 class EstrategiaValuacionConSP500:
     def __init__(self, sp500_ticker='^GSPC', lookback_days=7):
         """
@@ -83,7 +99,7 @@ class EstrategiaValuacionConSP500:
         start_str = start_date.strftime('%Y-%m-%d')
         end_str = end_date.strftime('%Y-%m-%d')
         try:
-            data = self._yf.download(self.sp500_ticker, start=start_str, end=end_str, progress=False)
+            data = descargar_indice(self.sp500_ticker, start_str, end_str)
         except Exception as e:
             print(f"Error descargando S&P 500: {e}. Solo se mostrará la serie de estrategia.")
             plt.figure()
@@ -0,0 +1,110 @@
+import numpy as np
+
+from utils import analitica
+
+
+def tae(tasacion, inicial, fecha, fechaInicial):
+    period = fecha - fechaInicial
+    return analitica.tae(tasacion, inicial, period.days + period.seconds/86400+1)
+
+
+class Informe:
+    """
+    Salida del simulador. Simulator.execute llama a registrar() una vez por barra;
+    el formateo y la escritura quedan fuera del bucle caliente salvo en InformeConsola.
+    """
+    def registrar(self, simulator, date, tasacion, comision, ddpp1, ddpp2):
+        pass
+
+
+class InformeSilencioso(Informe):
+    """No escribe nada."""
+
+
+class InformeConsola(Informe):
+    """Salida clásica: comisión, valoración, cartera, TAE y DDPP en cada barra."""
+    def registrar(self, simulator, date, tasacion, comision, ddpp1, ddpp2):
+        # Imprime la comisión con dos decimales
+        print(f"Comisión: ${comision:.2f}")
+        print(str(date)[:11]+"Value: $"+str(int(tasacion)),end=" ")
+        print("$"+str(int(simulator.money)), end=" ")
+        for i in simulator.stockIndex():
+            print(simulator.symbols[i]+"/"+str(simulator.stocks[i]), end=" ")
+        print()
+        print("TAE: {:.2%}".format(tae(tasacion, simulator.initialMoney, date, simulator.initialDate)), end=" ")
+        print("DDPP: {:.2%}/{:.2%}".format(ddpp1, ddpp2), end=" ")
+
+        if tasacion<-simulator.money:
+            print("Quebrado")
+
+
+class InformePeriodico(Informe):
+    """Una línea de resumen cada `cada` barras."""
+    def __init__(self, cada=20):
+        self.cada = cada
+        self.n = 0
+
+    def registrar(self, simulator, date, tasacion, comision, ddpp1, ddpp2):
+        self.n += 1
+        if self.n % self.cada:
+            return
+        print(f"{str(date)[:10]} Value: ${int(tasacion)} ${int(simulator.money)} "
+              f"Posiciones: {simulator.numberOfStocksInPortfolio} "
+              f"TAE: {tae(tasacion, simulator.initialMoney, date, simulator.initialDate):.2%} "
+              f"DDPP: {ddpp1:.2%}/{ddpp2:.2%} Comisión total: ${simulator.totalComision:.2f}")
+
+
+class InformeRegistro(Informe):
+    """
+    Guarda una fila por barra en un búfer columnar (arrays numpy que crecen por duplicación).
+    Al final curva() devuelve la serie de valoraciones y columnas() todas las series.
+    Con SimulatorMulti cada fila es un vector por cartera y las series son (barras x carteras).
+    """
+    CAMPOS = ("tasacion", "money", "comision", "ddpp1", "ddpp2", "posiciones", "negociado")
+
+    def __init__(self, capacidad=2048):
+        self.n = 0
+        self.capacidad = capacidad
+        self.fechas = np.zeros(capacidad, dtype=np.int64)
+        self.datos = None  # se reserva en la primera barra, con la forma de la valoración
+
+    def _crecer(self):
+        self.fechas = np.concatenate([self.fechas, np.zeros_like(self.fechas)])
+        self.datos = {campo: np.concatenate([valores, np.zeros_like(valores)]) for campo, valores in self.datos.items()}
+
+    def registrar(self, simulator, date, tasacion, comision, ddpp1, ddpp2):
+        if self.datos is None:
+            forma = (self.capacidad,) + np.shape(tasacion)
+            self.datos = {campo: np.zeros(forma) for campo in self.CAMPOS}
+        if self.n == self.fechas.size:
+            self._crecer()
+        self.fechas[self.n] = date.value
+        fila = (tasacion, simulator.money, comision, ddpp1, ddpp2, simulator.numberOfStocksInPortfolio,
+                simulator.negociado)
+        for campo, valor in zip(self.CAMPOS, fila):
+            self.datos[campo][self.n] = valor
+        self.n += 1
+
+    def curva(self):
+        return self.datos["tasacion"][:self.n] if self.datos is not None else np.zeros(0)
+
+    def metricas(self, periodos=252):
+        """Métricas de utils.analitica de la curva registrada (una por cartera con SimulatorMulti)."""
+        columnas = self.columnas()
+        curva = columnas["tasacion"].T
+        return analitica.metricas(curva, columnas["fecha"], comision=columnas["comision"].T,
+                                  invertido=(columnas["tasacion"] - columnas["money"]).T,
+                                  negociado=columnas["negociado"].T, periodos=periodos)
+
+    def columnas(self):
+        columnas = {campo: valores[:self.n] for campo, valores in (self.datos or {}).items()}
+        columnas["fecha"] = self.fechas[:self.n].astype("datetime64[ns]")
+        return columnas
+
+
+INFORMES = {
+    "consola": InformeConsola,
+    "silencioso": InformeSilencioso,
+    "periodico": InformePeriodico,
+    "registro": InformeRegistro,
+}
@@ -0,0 +1,121 @@
+import numpy as np
+
+COMPRA = 1
+VENTA = -1
+
+
+class RegistroEjecuciones:
+    """
+    Log de ejecuciones en arrays preasignados que crecen por duplicación.
+    Cada fila: fecha (ns), posición en el libro (índice plano), lado, id de orden, acciones y precio.
+    """
+    CAMPOS = (("fecha", np.int64), ("posicion", np.int64), ("lado", np.int8),
+              ("id", np.int64), ("acciones", np.float64), ("precio", np.float64))
+
+    def __init__(self, capacidad=4096):
+        self.n = 0
+        self.datos = {campo: np.zeros(capacidad, dtype=dtype) for campo, dtype in self.CAMPOS}
+
+    def agregar(self, fecha, lado, ejecutadas, ids, precios):
+        posiciones = np.flatnonzero(ejecutadas)
+        k = posiciones.size
+        if k == 0:
+            return
+        while self.n + k > self.datos["fecha"].size:
+            self.datos = {campo: np.concatenate([v, np.zeros_like(v)]) for campo, v in self.datos.items()}
+        fila = slice(self.n, self.n + k)
+        self.datos["fecha"][fila] = fecha
+        self.datos["posicion"][fila] = posiciones
+        self.datos["lado"][fila] = lado
+        self.datos["id"][fila] = ids.ravel()[posiciones]
+        self.datos["acciones"][fila] = ejecutadas.ravel()[posiciones]
+        self.datos["precio"][fila] = precios.ravel()[posiciones]
+        self.n += k
+
+    def columnas(self):
+        return {campo: v[:self.n] for campo, v in self.datos.items()}
+
+    def restaurar(self, columnas):
+        self.n = len(columnas["fecha"])
+        capacidad = max(self.datos["fecha"].size, self.n)
+        self.datos = {campo: np.zeros(capacidad, dtype=dtype) for campo, dtype in self.CAMPOS}
+        for campo, _ in self.CAMPOS:
+            self.datos[campo][:self.n] = columnas[campo]
+
+
+class LibroOrdenes:
+    """
+    Órdenes límite vivas: como mucho una de compra y una de venta por símbolo (y por cartera,
+    si `forma` es (carteras x símbolos)). Todo el estado son arrays con esa forma, así que
+    casar las órdenes de una barra son unas pocas operaciones vectorizadas.
+
+    Las órdenes son de día (se cancelan al cerrar la barra) o GTC (siguen vivas hasta
+    ejecutarse del todo o cancelarse). Cada orden tiene un id único.
+    """
+    def __init__(self, forma):
+        self.forma = forma
+        self.precioCompra = np.zeros(forma)
+        self.accionesCompra = np.zeros(forma)  # acciones pendientes
+        self.gtcCompra = np.zeros(forma, dtype=bool)
+        self.idCompra = np.zeros(forma, dtype=np.int64)
+        self.precioVenta = np.zeros(forma)
+        self.accionesVenta = np.zeros(forma)
+        self.gtcVenta = np.zeros(forma, dtype=bool)
+        self.idVenta = np.zeros(forma, dtype=np.int64)
+        self.siguienteId = 1
+        self.ejecuciones = RegistroEjecuciones()
+
+    ARRAYS = ("precioCompra", "accionesCompra", "gtcCompra", "idCompra",
+              "precioVenta", "accionesVenta", "gtcVenta", "idVenta")
+
+    def estado(self):
+        estado = {nombre: getattr(self, nombre).copy() for nombre in self.ARRAYS}
+        estado["siguienteId"] = self.siguienteId
+        estado.update({"ejecuciones." + k: v.copy() for k, v in self.ejecuciones.columnas().items()})
+        return estado
+
+    def restaurar(self, estado):
+        for nombre in self.ARRAYS:
+            actual = getattr(self, nombre)
+            setattr(self, nombre, np.array(estado[nombre], dtype=actual.dtype).reshape(actual.shape))
+        self.siguienteId = int(estado["siguienteId"])
+        self.ejecuciones.restaurar({k[12:]: v for k, v in estado.items() if k.startswith("ejecuciones.")})
+
+    def _nuevoId(self):
+        id = self.siguienteId
+        self.siguienteId += 1
+        return id
+
+    def comprar(self, posicion, precio, acciones, gtc=False):
+        """Sustituye la orden de compra de esa posición; devuelve su id."""
+        self.precioCompra[posicion] = precio
+        self.accionesCompra[posicion] = acciones
+        self.gtcCompra[posicion] = gtc
+        self.idCompra[posicion] = self._nuevoId()
+        return self.idCompra[posicion]
+
+    def vender(self, posicion, precio, acciones, gtc=False):
+        """Sustituye la orden de venta de esa posición; devuelve su id."""
+        self.precioVenta[posicion] = precio
+        self.accionesVenta[posicion] = acciones
+        self.gtcVenta[posicion] = gtc
+        self.idVenta[posicion] = self._nuevoId()
+        return self.idVenta[posicion]
+
+    def cancelar(self, id):
+        for ids, acciones in ((self.idCompra, self.accionesCompra), (self.idVenta, self.accionesVenta)):
+            acciones[ids == id] = 0
+
+    def casar(self, low, high, precio, pendientes):
+        """Máscara de órdenes ejecutables en la barra: low < límite < high."""
+        return (pendientes > 0) & (low < precio) & (precio < high)
+
+    def finBarra(self):
+        """Cancela las órdenes de día y libera las ya completadas."""
+        self.accionesCompra[~self.gtcCompra] = 0
+        self.accionesVenta[~self.gtcVenta] = 0
+        for precio, acciones, ids in ((self.precioCompra, self.accionesCompra, self.idCompra),
+                                      (self.precioVenta, self.accionesVenta, self.idVenta)):
+            libre = acciones <= 0
+            precio[libre] = 0
+            ids[libre] = 0
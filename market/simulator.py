@@ -1,116 +1,308 @@
 
+import bisect
+
 import numpy as np
+from pandas import Timestamp
+
+from market.informe import InformeConsola, InformeSilencioso
+from market.ordenes import LibroOrdenes, COMPRA, VENTA
+from market.comisiones import ComisionPorAccion, COMISION_LEGADA
+
+def acciones(buy, amount, price, entero=True):
+    """Acciones compradas por símbolo (float64): amount/price donde hay compra, truncadas si son enteras."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.where(buy, amount/np.where(buy, price, 1), 0)
+    return np.trunc(n) if entero else n
+
+def comprobarDesborde(stocks, nuevas, symbols):
+    """Lanza OverflowError si alguna posición entera no cabe en su dtype tras sumar `nuevas`."""
+    if not np.issubdtype(stocks.dtype, np.integer):
+        return
+    maximo = np.iinfo(stocks.dtype).max
+    total = stocks.astype(np.float64) + nuevas
+    if np.any(total > maximo):
+        i = np.unravel_index(np.argmax(total), total.shape)
+        raise OverflowError(f"La posición de {symbols[i[-1]]} ({total[i]:.0f} acciones) no cabe en {stocks.dtype}")
 
 class DDPP:
+    """
+    Draw Down por Percentiles: proporción de la ventana que queda por debajo del valor actual.
+    Además del anillo se mantiene una copia ordenada de la ventana, de modo que cada
+    actualización es una búsqueda binaria y una inserción/borrado, sin recorrer la ventana.
+    """
     def __init__(self,windowSize):
         self.d= np.zeros(windowSize, dtype=np.float64)
         self.i=0
         self.size=1
         self.total=0
         self.base=0
+        self.ordenados=[0.0]  # d[:size] ordenado
 
     def add(self, value):
-        n=0
-        for i in range(self.size):
-            if value < self.d[i]:
-                n+=1
+        value = float(value)
+        # Cuántos valores de la ventana superan al nuevo
+        n = len(self.ordenados) - bisect.bisect_right(self.ordenados, value)
         cur=n/self.size
         self.total += n
         self.base+=self.size
+        del self.ordenados[bisect.bisect_left(self.ordenados, self.d[self.i])]
+        bisect.insort(self.ordenados, value)
         self.d[self.i] = value
         self.i = (self.i + 1) % self.d.size
         if self.size < self.d.size:
             self.size += 1
+            bisect.insort(self.ordenados, self.d[self.size - 1])
         return 1-cur, 1-self.total/self.base
 
+    def estado(self):
+        return {"d": self.d.copy(), "i": self.i, "size": self.size, "total": self.total, "base": self.base}
+
+    def restaurar(self, estado):
+        self.d = np.array(estado["d"], dtype=np.float64)
+        self.i = int(estado["i"])
+        self.size = int(estado["size"])
+        self.total = float(estado["total"])
+        self.base = float(estado["base"])
+        self.ordenados = sorted(self.d[:self.size].tolist())
+
+    def add_many(self, values):
+        """Procesa una serie completa de valoraciones; devuelve los dos DDPP como arrays."""
+        values = np.asarray(values, dtype=np.float64)
+        instantaneo = np.empty(values.size)
+        medio = np.empty(values.size)
+        for k, value in enumerate(values):
+            instantaneo[k], medio[k] = self.add(value)
+        return instantaneo, medio
+
+class DDPPMulti:
+    """
+    DDPP de n carteras a la vez: un anillo (n x ventana) y el recuento vectorizado
+    de los valores que superan a cada nueva valoración. Mismos resultados que n DDPP.
+    """
+    def __init__(self, n, windowSize):
+        self.d = np.zeros((n, windowSize), dtype=np.float64)
+        self.i = 0
+        self.size = 1
+        self.total = np.zeros(n)
+        self.base = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = np.count_nonzero(values[:, None] < self.d[:, :self.size], axis=1)
+        cur = n/self.size
+        self.total += n
+        self.base += self.size
+        self.d[:, self.i] = values
+        self.i = (self.i + 1) % self.d.shape[1]
+        if self.size < self.d.shape[1]:
+            self.size += 1
+        return 1-cur, 1-self.total/self.base
+
+    def estado(self):
+        return {"d": self.d.copy(), "i": self.i, "size": self.size, "total": self.total.copy(), "base": self.base}
+
+    def restaurar(self, estado):
+        self.d = np.array(estado["d"], dtype=np.float64)
+        self.i = int(estado["i"])
+        self.size = int(estado["size"])
+        self.total = np.array(estado["total"], dtype=np.float64)
+        self.base = float(estado["base"])
+
 class Simulator:
-    def __init__(self,symbols,comisionFija=0.0035+(0.000166+0.000022)-0.002):
+    def __init__(self,symbols,comisionFija=COMISION_LEGADA,ventanaDDPP=240,informe=None,
+                 tipoPosicion=np.int64,participacion=None,costes=None):
+        """
+        informe: salida por barra (market.informe). Por defecto InformeConsola;
+        InformeSilencioso, InformePeriodico o InformeRegistro sacan el formateo del bucle.
+        tipoPosicion: dtype de las posiciones. Entero (int64 por defecto) compra acciones enteras
+        y lanza OverflowError si una posición no cabe; float64 permite acciones fraccionarias.
+        participacion: fracción máxima del volumen de la barra que puede ejecutar una orden
+        (None: sin límite). Solo se aplica si execute recibe `volume`.
+        costes: modelo de comisión/deslizamiento (market.comisiones); por defecto
+        ComisionPorAccion(comisionFija). Se evalúa sobre todas las ejecuciones de la barra a la vez.
+        """
         self.money = 0
         size=len(symbols)
-        self.stocks=np.zeros(size, dtype=np.int16)
-        self.pBuy=np.zeros(size)
-        self.amount=np.zeros(size)
-        self.pSell=np.zeros(size)
+        self.stocks=np.zeros(size, dtype=tipoPosicion)
+        self.libro=LibroOrdenes(self.stocks.shape)
+        self.participacion=participacion
         self.numberOfStocksInPortfolio=0
         self.symbols=symbols
         self.initial=True
         self.comisionFija=comisionFija
+        self.costes=costes if costes is not None else ComisionPorAccion(comisionFija)
+        self.volumenMes=0
+        self.mes=None
         self.comision=0
+        self.negociado=0  # nominal comprado más vendido en la última barra
         self.totalComision=0
-        self.ddpp=DDPP(240)
+        self.ddpp=DDPP(ventanaDDPP)
         self.initialProgram=False
+        self.informe=informe if informe is not None else InformeConsola()
+
+    def _entero(self):
+        return np.issubdtype(self.stocks.dtype, np.integer)
 
-    def programBuy(self, id, price, amount):
-        self.pBuy[id]= price
-        self.amount[id] = amount
+    def programBuy(self, id, price, amount, gtc=False):
+        """Orden límite de compra por importe `amount`; devuelve el id de la orden."""
         self.initialProgram = True
+        return self.libro.comprar(id, price, acciones(True, amount, price, self._entero()), gtc)
 
-    def programSell(self, id, price, amount):
-        self.pSell[id] = price
-        self.amount[id] = amount
+    def programSell(self, id, price, amount, gtc=False):
+        """Orden límite de venta por importe `amount` (acciones = amount/price, como mucho la posición)."""
         self.initialProgram = True
+        n = amount/price if price > 0 else 0
+        return self.libro.vender(id, price, np.round(n) if self._entero() else n, gtc)
+
+    def cancel(self, orderId):
+        self.libro.cancelar(orderId)
+
+    def _limitarVolumen(self, acciones, volume):
+        # Ejecución parcial: como mucho una fracción del volumen de la barra
+        if volume is None or self.participacion is None:
+            return acciones
+        maximo = self.participacion*np.asarray(volume, dtype=np.float64)
+        maximo = np.where(np.isnan(maximo), np.inf, maximo)  # sin dato de volumen no se limita
+        if self._entero():
+            maximo = np.floor(maximo)
+        return np.minimum(acciones, maximo)
 
-    def execute(self, low, high, close,date):
+    def execute(self, low, high, close, date, volume=None):
+        """
+        Casa las órdenes vivas con la barra al precio límite. Las compras se ejecutan antes
+        que las ventas; una venta nunca supera la posición. Con `volume` y `participacion`
+        cada orden se ejecuta como mucho por participacion*volumen y el resto sigue pendiente
+        (si es GTC). Las órdenes de día se cancelan al final de la barra.
+        """
         if not self.initialProgram:
             return 
         if self.initial:
-            self.initialMoney=self.money
+            self.initialMoney=self.money.copy() if isinstance(self.money, np.ndarray) else self.money
             self.initialDate=date
             self.initial = False
+        libro=self.libro
+        mes=(date.year, date.month)
+        if mes != self.mes:
+            self.volumenMes=self.volumenMes*0
+            self.mes=mes
+
+        buy=libro.casar(low, high, libro.precioCompra, libro.accionesCompra)
+        intBuy=self._limitarVolumen(np.where(buy, libro.accionesCompra, 0), volume)
+        comprobarDesborde(self.stocks, intBuy, self.symbols)
+        self.stocks+=intBuy.astype(self.stocks.dtype)
+        self.negociado=np.sum(intBuy*libro.precioCompra, axis=-1)
+        self.money-=self.negociado
+        self.comision= np.sum(self.costes.coste(intBuy, libro.precioCompra, low, high, self.volumenMes), axis=-1)
+        libro.accionesCompra-=intBuy
+
+        sell=libro.casar(low, high, libro.precioVenta, libro.accionesVenta)
+        intSell=self._limitarVolumen(np.where(sell, np.minimum(libro.accionesVenta, self.stocks), 0), volume)
+        self.stocks-=intSell.astype(self.stocks.dtype)
+        vendido=np.sum(intSell*libro.precioVenta, axis=-1)
+        self.money+=vendido
+        self.negociado=self.negociado+vendido
+        self.comision+= np.sum(self.costes.coste(intSell, libro.precioVenta, low, high, self.volumenMes), axis=-1)
+        self.volumenMes=self.volumenMes+np.sum(intBuy+intSell, axis=-1)
+        libro.accionesVenta-=intSell
+        # Sin posición que vender la orden queda completada
+        libro.accionesVenta[sell & (self.stocks == 0)] = 0
+
+        fecha = date.value
+        libro.ejecuciones.agregar(fecha, COMPRA, intBuy, libro.idCompra, libro.precioCompra)
+        libro.ejecuciones.agregar(fecha, VENTA, intSell, libro.idVenta, libro.precioVenta)
+        libro.finBarra()
 
-        amounts=self.amount>0
-        low2=low*amounts
-        high2=high*amounts
-        
-        buy1=low2<self.pBuy 
-        buy2=self.pBuy<high2
-        buy=buy1 & buy2
-        intBuy=np.array(self.amount/self.pBuy, dtype=np.int16)
-        self.stocks+=np.where(self.pBuy==0,0,buy*intBuy)
-        self.money-=np.sum(buy*intBuy*self.pBuy)
-
-        self.comision= np.sum(buy*intBuy*self.comisionFija)
-
-        # Pendiente de implementar la venta
-        sell1=low2<self.pSell 
-        sell2=self.pSell<high2
-        sell=sell1 & sell2
-        self.stocks=np.where(sell,0,self.stocks)
-        self.money+=np.sum(sell*self.amount)
-
-        self.comision+= np.sum(sell*self.amount*self.comisionFija)
         self.money -= self.comision
-        # Imprime la comisión con dos decimales
-        print(f"Comisión: ${self.comision:.2f}")
+        comision = self.comision
         self.totalComision += self.comision
         self.comision=0
 
-        # Resetea las órdenes
-        self.pBuy[:]=0
-        self.pSell[:]=0
-        self.amount[:]=0
-
         # Tasación
-        tasacion=self.money+ np.sum(self.stocks*close)
-        self.numberOfStocksInPortfolio = np.count_nonzero(self.stocks)
-        print(str(date)[:11]+"Value: $"+str(int(tasacion)),end=" ")
-        print("$"+str(int(self.money)), end=" ")
-        for i in self.stockIndex():
-            print(self.symbols[i]+"/"+str(self.stocks[i]), end=" ")
-
+        tasacion=self.money+ np.sum(self.stocks*close, axis=-1)
+        self.numberOfStocksInPortfolio = np.count_nonzero(self.stocks, axis=-1)
         ddpp1,ddpp2= self.ddpp.add(tasacion)
-
-        print()
-        period= date - self.initialDate
-        days=period.days + period.seconds/86400+1
-        tae= (tasacion / self.initialMoney)**(365/days) - 1
-        print("TAE: {:.2%}".format(tae), end=" ")
-        print("DDPP: {:.2%}/{:.2%}".format(ddpp1, ddpp2), end=" ")
-
-
-        if tasacion<-self.money:
-            print("Quebrado")
+        self.informe.registrar(self, date, tasacion, comision, ddpp1, ddpp2)
         return tasacion
 
     def stockIndex(self):
         return np.nonzero(self.stocks)[0]
+
+    def sincronizar(self, money, stocks):
+        """Sustituye efectivo y posiciones por los de la cartera real (la del broker)."""
+        stocks = np.asarray(stocks, dtype=np.float64)
+        if stocks.shape != self.stocks.shape:
+            raise ValueError(f"La cartera es de {stocks.shape} posiciones y el simulador de {self.stocks.shape}")
+        self.money = float(money)
+        self.stocks = (np.round(stocks) if self._entero() else stocks).astype(self.stocks.dtype)
+
+    def estado(self):
+        """
+        Estado completo como dict plano de arrays (claves "ddpp.*" y "libro.*" para las partes),
+        listo para market.checkpoint. El modelo de costes y el informe no se guardan.
+        """
+        estado = {
+            "money": self.money, "stocks": self.stocks, "totalComision": self.totalComision,
+            "numberOfStocksInPortfolio": self.numberOfStocksInPortfolio, "volumenMes": self.volumenMes,
+            "mes": self.mes or (0, 0), "initial": self.initial, "initialProgram": self.initialProgram,
+            "initialMoney": getattr(self, "initialMoney", 0),
+            "initialDate": self.initialDate.value if hasattr(self, "initialDate") else 0,
+        }
+        estado.update({"ddpp." + k: v for k, v in self.ddpp.estado().items()})
+        estado.update({"libro." + k: v for k, v in self.libro.estado().items()})
+        return {k: np.array(v, copy=True) for k, v in estado.items()}
+
+    def restaurar(self, estado):
+        """Inverso de estado(): el simulador debe crearse con los mismos símbolos y forma."""
+        if np.shape(estado["stocks"]) != self.stocks.shape:
+            raise ValueError(f"El estado es de {np.shape(estado['stocks'])} posiciones y el simulador de {self.stocks.shape}")
+        escalar = lambda v: v.item() if np.ndim(v) == 0 else np.array(v)
+        self.money = escalar(estado["money"])
+        self.stocks = np.array(estado["stocks"], dtype=self.stocks.dtype)
+        self.totalComision = escalar(estado["totalComision"])
+        self.numberOfStocksInPortfolio = escalar(estado["numberOfStocksInPortfolio"])
+        self.volumenMes = escalar(estado["volumenMes"])
+        mes = tuple(int(x) for x in estado["mes"])
+        self.mes = mes if mes != (0, 0) else None
+        self.initial = bool(estado["initial"])
+        self.initialProgram = bool(estado["initialProgram"])
+        if not self.initial:
+            self.initialMoney = escalar(estado["initialMoney"])
+            self.initialDate = Timestamp(int(estado["initialDate"]))
+        self.ddpp.restaurar({k[5:]: v for k, v in estado.items() if k.startswith("ddpp.")})
+        self.libro.restaurar({k[6:]: v for k, v in estado.items() if k.startswith("libro.")})
+
+
+class SimulatorMulti(Simulator):
+    """
+    n carteras sobre el mismo panel de precios en un único estado vectorizado: money,
+    stocks, el libro de órdenes y las comisiones llevan delante el eje de cartera
+    (n x símbolos) y cada execute avanza todas las carteras a la vez por broadcasting.
+    execute devuelve la valoración de cada cartera (vector de n).
+    """
+    def __init__(self, symbols, n, money=0, informe=None, **kwargs):
+        super().__init__(symbols, informe=informe if informe is not None else InformeSilencioso(), **kwargs)
+        forma = (n, len(symbols))
+        self.n = n
+        self.stocks = np.zeros(forma, dtype=self.stocks.dtype)
+        self.libro = LibroOrdenes(forma)
+        self.money = np.broadcast_to(np.asarray(money, dtype=np.float64), (n,)).copy()
+        self.numberOfStocksInPortfolio = np.zeros(n, dtype=np.int64)
+        self.totalComision = np.zeros(n)
+        self.volumenMes = np.zeros(n)
+        self.ddpp = DDPPMulti(n, self.ddpp.d.size)
+
+    def programBuy(self, cartera, id, price, amount, gtc=False):
+        return super().programBuy((cartera, id), price, amount, gtc)
+
+    def programSell(self, cartera, id, price, amount, gtc=False):
+        return super().programSell((cartera, id), price, amount, gtc)
+
+    def programOrders(self, cartera, orders):
+        """Programa una respuesta de StrategyClient.open para la cartera indicada."""
+        for order in orders["programBuy"]:
+            self.programBuy(cartera, order["id"], order["price"], order["amount"])
+        for order in orders["programSell"]:
+            self.programSell(cartera, order["id"], order["price"], order["amount"])
+
+    def stockIndex(self, cartera=0):
+        return np.nonzero(self.stocks[cartera])[0]
@@ -3,40 +3,75 @@ import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 
-import os
-import pickle
-import hashlib
-import functools
-
-def make_hash(func_name, args, kwargs):
-    """Crea un hash único para la función y sus argumentos."""
-    data = (func_name, tuple(sorted(kwargs.items())))
-    data_bytes = pickle.dumps(data)
-    return hashlib.md5(data_bytes).hexdigest()
-
-def disk_cache(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        # Crear la carpeta de cache si no existe
-        cache_dir = "../cache"
-        os.makedirs(cache_dir, exist_ok=True)
-        
-        # Crear el hash y el nombre del archivo
-        key = make_hash(func.__name__, args, kwargs)
-        cache_file = os.path.join(cache_dir, f"{key}.pkl")
-        
-        # Si el archivo ya existe, cargar el resultado
-        if os.path.exists(cache_file):
-            with open(cache_file, "rb") as f:
-                return pickle.load(f)
-        
-        # Si no, llamar a la función y guardar el resultado
-        result = func(*args, **kwargs)
-        with open(cache_file, "wb") as f:
-            pickle.dump(result, f)
-        return result
-
-    return wrapper
+import threading
+from collections.abc import Sequence
+
+from market.descarga import DescargaParalela, cotizar
+from market.almacen import AlmacenIncremental, AlmacenPaneles, columna_fecha
+from market.cache import disk_cache, cache_por_defecto
+
+BLOQUEO_YF = threading.Lock()
+
+def descargar_yf(instrumento, start, end, interval, progress=False, group_by="column"):
+    # yf.download guarda el estado de cada llamada en variables globales del módulo,
+    # así que las descargas reales se serializan; en cada lote yfinance ya paraleliza por ticker.
+    with BLOQUEO_YF:
+        return yf.download(
+            instrumento,
+            start=start,
+            end=end,
+            interval=interval,
+            progress=progress,
+            group_by=group_by
+        )
+
+URL_SP500 = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+
+@disk_cache(max_edad=24 * 3600)
+def tickers_sp500(url=URL_SP500):
+    """Símbolos de la composición actual del S&P 500 según Wikipedia (cacheados un día)."""
+    return pd.read_html(url)[0]['Symbol'].tolist()
+
+def a_int64(fechas):
+    """Convierte una serie de fechas a nanosegundos int64 (UTC si traen zona horaria)."""
+    fechas = pd.to_datetime(pd.Series(fechas))
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_convert("UTC").dt.tz_localize(None)
+    return fechas.to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+def a_timestamps(fechas_ns):
+    return pd.to_datetime(fechas_ns).tolist()
+
+class VistaPanel(Sequence):
+    """
+    Vista perezosa y de solo lectura de un panel (símbolos x fechas).
+    vista[i] devuelve una tupla con los valores del símbolo i en las fechas con vela,
+    igual que las antiguas listas por símbolo. Se materializa bajo demanda y se guarda.
+    """
+    def __init__(self, panel, valido, convertir=None):
+        self._panel = panel
+        self._valido = valido
+        self._convertir = convertir
+        self._filas = {}
+
+    def __len__(self):
+        return self._valido.shape[0]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        fila = self._filas.get(i)
+        if fila is None:
+            mascara = self._valido[i]
+            if self._panel.ndim == 1:
+                valores = self._panel[mascara]
+            else:
+                valores = self._panel[i, mascara]
+            fila = tuple(self._convertir(valores) if self._convertir else valores.tolist())
+            self._filas[i] = fila
+        return fila
 
 class Source:
     LIMITES_INTERVALO = {
@@ -51,39 +86,110 @@ class Source:
         "1mo": None,
     }
 
-    def __init__(self, lista_instrumentos, fecha_inicio, fecha_fin, intervalo):
+    def __init__(self, lista_instrumentos, fecha_inicio, fecha_fin, intervalo, descargador=None, lote=50, hilos=8,
+                 almacen=True, paneles=True):
+        """
+        descargador: función (instrumentos, inicio, fin, intervalo) -> DataFrame estilo yf.download
+        con group_by="ticker". Por defecto descargar_lote; permite usar un stub local.
+        lote: instrumentos por petición. hilos: peticiones simultáneas.
+        almacen: True usa el AlmacenIncremental por defecto, que solo descarga las velas que faltan;
+        también se puede pasar un AlmacenIncremental propio, o None para descargar siempre todo.
+        paneles: True guarda el panel limpio en el AlmacenPaneles por defecto y lo reutiliza
+        mapeado en memoria en los arranques sin velas nuevas; None lo desactiva.
+        """
         self.lista_instrumentos = lista_instrumentos
         self.fecha_inicio = fecha_inicio
         self.fecha_fin = fecha_fin
         self.intervalo = intervalo
+        self.descargador = descargador
+        self.lote = lote
+        self.hilos = hilos
+        self.almacen = AlmacenIncremental() if almacen is True else almacen
+        self.paneles = AlmacenPaneles() if paneles is True else paneles
         self.datos_por_instrumento = {}
+        self.fallidos = []  # (instrumentos, bloque, error) de la última descarga
+        self.desfasados = []  # instrumentos con velas guardadas cuya última descarga falló
+        self._dates = self._open = self._close = self._high = self._low = self._volume = None
 
         gestor = self
         gestor.descargar_datos()
-        datos_limpiados = gestor.limpiar_datos()
-        # saca las claves en self.symbols
-        self.symbols = list(datos_limpiados.keys())
-        self.size= len(self.symbols)
-
-        self.dates=[]
-        self.open=[]
-        self.close=[]
-        self.high=[]
-        self.low=[]
-        for symbol in self.symbols:
-            df = datos_limpiados[symbol]
-            self.dates.append(df['Date'].tolist())
-            self.open.append(df['Open'].tolist())
-            self.close.append(df['Close'].tolist())
-            self.high.append(df['High'].tolist())
-            self.low.append(df['Low'].tolist())
-        self.dates = self.dates
-        self.open = self.open
-        self.close = self.close
-        self.high = self.high
-        self.low = self.low
-        
 
+        # Arranque en caliente: si no hay velas nuevas el panel ya limpio se abre mapeado en memoria
+        clave = None
+        if self.paneles is not None and self.datos_por_instrumento:
+            ultimas = {i: columna_fecha(df).max() for i, df in self.datos_por_instrumento.items()}
+            clave = self.paneles.clave(lista_instrumentos, fecha_inicio, intervalo, ultimas)
+            panel = self.paneles.cargar(clave)
+            if panel is not None:
+                for nombre, valor in panel.items():
+                    setattr(self, nombre, valor)
+                self.size = len(self.symbols)
+                self.datos_por_instrumento = {}
+                return
+
+        panel = gestor.limpiar_datos()
+        if panel is None:
+            raise ValueError("No se han obtenido datos para ningún instrumento.")
+        for nombre, valor in panel.items():
+            setattr(self, nombre, valor)
+        self.size = len(self.symbols)
+        # Una vez construido el panel los DataFrames ya no hacen falta
+        self.datos_por_instrumento = {}
+
+        if self.desfasados:
+            # Faltan instrumentos que sí tienen velas guardadas: el siguiente arranque los vuelve a pedir.
+            # Los que nunca han devuelto datos (p. ej. BRK.B en Yahoo) no impiden guardarlo.
+            print(f"⚠️ Panel sin guardar: fallaron {len(self.desfasados)} instrumentos con velas guardadas")
+        elif self.paneles is not None:
+            self.paneles.guardar(clave, self)
+            for nombre, valor in self.paneles.cargar(clave).items():
+                setattr(self, nombre, valor)
+
+    def estadisticas_cache(self):
+        """Estadísticas de las cachés en disco que usa este Source: llamadas, velas y paneles."""
+        stats = {"llamadas": cache_por_defecto().estadisticas()}
+        if self.almacen is not None:
+            stats["velas"] = self.almacen.estadisticas()
+        if self.paneles is not None:
+            stats["paneles"] = self.paneles.estadisticas()
+        return stats
+
+    # Vistas de compatibilidad: listas por símbolo, solo con las velas existentes.
+    @property
+    def dates(self):
+        if self._dates is None:
+            self._dates = VistaPanel(self.fechas_ns, self.valido, a_timestamps)
+        return self._dates
+
+    @property
+    def open(self):
+        if self._open is None:
+            self._open = VistaPanel(self.panel_open, self.valido)
+        return self._open
+
+    @property
+    def close(self):
+        if self._close is None:
+            self._close = VistaPanel(self.panel_close, self.valido)
+        return self._close
+
+    @property
+    def high(self):
+        if self._high is None:
+            self._high = VistaPanel(self.panel_high, self.valido)
+        return self._high
+
+    @property
+    def low(self):
+        if self._low is None:
+            self._low = VistaPanel(self.panel_low, self.valido)
+        return self._low
+
+    @property
+    def volume(self):
+        if self._volume is None:
+            self._volume = VistaPanel(self.panel_volume, self.valido)
+        return self._volume
 
     def dividir_rango_fechas(self, inicio, fin, max_dias):
         bloques = []
@@ -95,47 +201,99 @@ class Source:
             inicio_dt = bloque_fin_dt + timedelta(days=1)
         return bloques
 
-    @disk_cache
-    def get_datos(self,instrumento=None,start=None,end=None,interval=None,progress=False):
-        return yf.download(
-            instrumento,
-            start=start,
-            end=end,
-            interval=interval,
-            progress=progress
+    @disk_cache(version=lambda: getattr(yf, "__version__", None))
+    def get_datos(self,instrumento=None,start=None,end=None,interval=None,progress=False,group_by="column"):
+        return descargar_yf(instrumento, start, end, interval, progress, group_by)
+
+    def descargar_lote(self, instrumentos, inicio, fin, intervalo):
+        if self.almacen is not None:
+            # El almacén incremental ya hace de caché de las velas
+            return descargar_yf(instrumentos, inicio, fin, intervalo, False, "ticker")
+        return self.get_datos(
+            instrumento=instrumentos,
+            start=inicio,
+            end=fin,
+            interval=intervalo,
+            progress=False,
+            group_by="ticker"
         )
+
+    def bloques(self, inicio, fin):
+        limite = self.LIMITES_INTERVALO.get(self.intervalo)
+        if limite is not None:
+            return self.dividir_rango_fechas(inicio, fin, limite)
+        return [(inicio, fin)]
+
     def descargar_datos(self):
+        self.fallidos = []
+        self.desfasados = []
         try:
-            limite = self.LIMITES_INTERVALO.get(self.intervalo)
-            if limite is not None:
-                bloques = self.dividir_rango_fechas(self.fecha_inicio, self.fecha_fin, limite)
+            descarga = DescargaParalela(
+                self.descargador or self.descargar_lote,
+                lote=self.lote,
+                hilos=self.hilos
+            )
+
+            # Tramos que faltan por instrumento; sin almacén se pide siempre el rango completo
+            if self.almacen is None:
+                tramos = {i: [(self.fecha_inicio, self.fecha_fin)] for i in self.lista_instrumentos}
             else:
-                bloques = [(self.fecha_inicio, self.fecha_fin)]
-            
-            for instrumento in self.lista_instrumentos:
-                lista_dfs = []
-                for bloque in bloques:
-                    inicio_bloque, fin_bloque = bloque
-                    print(f"📥 Descargando {instrumento} desde {inicio_bloque} hasta {fin_bloque} con intervalo {self.intervalo}")
-                    df_bloque = self.get_datos(
-                        instrumento=instrumento,
-                        start=inicio_bloque,
-                        end=fin_bloque,
-                        interval=self.intervalo,
-                        progress=False
-                    )
-                    if not df_bloque.empty:
+                # Cada entrada del almacén se lee una sola vez y se reutiliza hasta el final
+                entradas = {i: self.almacen.leer(i, self.intervalo) for i in self.lista_instrumentos}
+                tramos = {i: self.almacen.pendientes(entradas[i], self.fecha_inicio, self.fecha_fin)
+                          for i in self.lista_instrumentos}
+
+            # Se agrupan los instrumentos que necesitan los mismos tramos para pedirlos por lotes
+            grupos = {}
+            for instrumento, pendientes in tramos.items():
+                if pendientes:
+                    grupos.setdefault(tuple(pendientes), []).append(instrumento)
+
+            nuevos = {}
+            for pendientes, instrumentos in grupos.items():
+                bloques = [bloque for inicio, fin in pendientes for bloque in self.bloques(inicio, fin)]
+                partes = descarga.ejecutar(instrumentos, bloques, self.intervalo)
+                self.fallidos.extend(descarga.fallidos)
+                fallidos = {i for lote, _, _ in descarga.fallidos for i in lote}
+                for instrumento in instrumentos:
+                    lista_dfs = []
+                    for df_bloque in partes.get(instrumento, []):
                         df_bloque = self.aplanar_columnas(df_bloque)
                         df_bloque.reset_index(inplace=True)
                         lista_dfs.append(df_bloque)
-                
-                if lista_dfs:
-                    self.datos_por_instrumento[instrumento] = pd.concat(lista_dfs, ignore_index=True)
+                    df = pd.concat(lista_dfs, ignore_index=True) if lista_dfs else None
+
+                    if self.almacen is None:
+                        if df is not None:
+                            nuevos[instrumento] = df
+                    elif df is not None and not df.empty and instrumento not in fallidos:
+                        entradas[instrumento] = self.almacen.fusionar(instrumento, self.intervalo, entradas[instrumento],
+                                                                      df, pendientes[0][0], pendientes[-1][1])
+
+            # Un instrumento con alguna descarga fallida se deja fuera, como si no tuviera datos:
+            # sus velas guardadas acaban antes que las del resto y recortarían el calendario común
+            fallidos = {i for lote, _, _ in self.fallidos for i in lote}
+            if self.almacen is not None:
+                self.desfasados = [i for i in self.lista_instrumentos if i in fallidos and entradas[i] is not None]
+            sin_datos = []
+            for instrumento in self.lista_instrumentos:
+                if instrumento in fallidos:
+                    df = None
+                elif self.almacen is None:
+                    df = nuevos.get(instrumento)
+                else:
+                    df = self.almacen.tramo(entradas[instrumento], self.fecha_inicio, self.fecha_fin)
+                if df is not None:
+                    self.datos_por_instrumento[instrumento] = df
                 else:
-                    print(f"⚠️ No se han obtenido datos para {instrumento} en el rango especificado.")
-            
+                    sin_datos.append(instrumento)
+            if sin_datos:
+                print(f"⚠️ No se han obtenido datos para {len(sin_datos)} instrumentos en el rango especificado: {', '.join(map(str, sin_datos))}")
+
             return self.datos_por_instrumento
         except Exception as error:
+            self.fallidos.append((list(self.lista_instrumentos), (self.fecha_inicio, self.fecha_fin), error))
+            self.desfasados = list(self.lista_instrumentos)
             print(f"❌ Error al descargar los datos: {error}")
             return None
 
@@ -151,43 +309,71 @@ class Source:
         return df
 
     def limpiar_datos(self):
-        if self.datos_por_instrumento:
-            for instrumento, df in self.datos_por_instrumento.items():
-                df.dropna(inplace=True)
-                df.drop_duplicates(inplace=True)
-                self.datos_por_instrumento[instrumento] = df
-            return self.datos_por_instrumento
-        else:
+        """
+        Limpia y alinea todo el universo en una sola pasada vectorizada y devuelve el panel:
+        symbols, fechas_ns (eje int64 común), panel_open/close/high/low/volume (símbolos x fechas,
+        NaN sin vela) y valido. Reglas:
+        - Se descartan las velas con algún precio OHLC ausente o no positivo (días suspendidos).
+          El volumen no cuenta: si falta queda NaN en una vela por lo demás válida.
+        - Si una fecha está repetida para un símbolo se queda la última descargada.
+        - Los símbolos que empiezan a cotizar tarde tienen NaN hasta su primera vela,
+          y los que se quedan sin ninguna vela se eliminan.
+        """
+        if not self.datos_por_instrumento:
             print("⚠️ No hay datos para limpiar.")
             return None
 
-    def realTime(self,symbols):
+        campos = ['Open', 'Close', 'High', 'Low']
+        largo = pd.concat(self.datos_por_instrumento, names=['Symbol', None]).reset_index(level=0)
+        fechas = a_int64(columna_fecha(largo))
+        precios = largo[campos].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        ok = (precios > 0).all(axis=1)  # NaN > 0 es False
+        volumen = pd.to_numeric(largo['Volume'], errors='coerce') if 'Volume' in largo else pd.Series(np.nan, index=largo.index)
+        precios = np.column_stack([precios, volumen.to_numpy(dtype=np.float64)])
+        campos = campos + ['Volume']
+
+        simbolos = pd.Categorical(largo['Symbol'], categories=list(self.datos_por_instrumento)).codes
+        simbolos, fechas, precios = simbolos[ok], fechas[ok], precios[ok]
+
+        fechas_ns, columnas = np.unique(fechas, return_inverse=True)
+        forma = (len(self.datos_por_instrumento), fechas_ns.size)
+        # Fechas repetidas: se busca la última aparición de cada (símbolo, fecha)
+        celdas = simbolos.astype(np.int64) * fechas_ns.size + columnas
+        _, ultimas = np.unique(celdas[::-1], return_index=True)
+        ultimas = celdas.size - 1 - ultimas
+        simbolos, columnas, precios = simbolos[ultimas], columnas[ultimas], precios[ultimas]
+
+        panel = {}
+        for k, campo in enumerate(campos):
+            matriz = np.full(forma, np.nan)
+            matriz[simbolos, columnas] = precios[:, k]
+            panel["panel_" + campo.lower()] = matriz
+        valido = np.zeros(forma, dtype=bool)
+        valido[simbolos, columnas] = True
+
+        con_datos = valido.any(axis=1)
+        if not con_datos.any():
+            print("⚠️ No hay datos para limpiar.")
+            return None
+        panel = {nombre: matriz[con_datos] for nombre, matriz in panel.items()}
+        panel["valido"] = valido[con_datos]
+        panel["fechas_ns"] = fechas_ns
+        panel["symbols"] = [s for s, hay in zip(self.datos_por_instrumento, con_datos) if hay]
+        return panel
+
+    def precio(self, symbol, timeout=10):
+        """Último precio de la sesión regular, pidiendo solo la vela en curso (sin ticker.info)."""
+        hist = yf.Ticker(symbol).history(period="1d", interval=self.intervalo, timeout=timeout)
+        if hist.empty:
+            return None
+        return float(hist["Close"].iloc[-1])
+
+    def realTime(self, symbols, hilos=16, timeout=10):
         """
         Obtiene el precio casi “en vivo” de los instrumentos especificados.
+        Devuelve un vector alineado con `symbols`, con 0 donde no se obtuvo precio.
         """
-        resultados = []  # para devolver un dict {símbolo: precio}
-        for symbol in symbols:
-            try:
-                ticker = yf.Ticker(symbol)
-                # regularMarketPrice = último precio en la sesión regular
-                precio = ticker.info.get("regularMarketPrice", None)
-                if precio is None:
-                    # fallback: usar la última vela (por si ticker.info falla)
-                    hist = ticker.history(period="1d", interval=self.intervalo, prepost=True)
-                    if not hist.empty:
-                        precio = hist["Close"].iloc[-1]
-                if precio is not None:
-                    resultados.append(precio)
-                    print(f"📈 {symbol} - Current price: {precio}")
-                else:
-                    resultados.append(0)
-                    print(f"⚠️ No se obtuvo precio para {symbol}")
-            except Exception as e:
-                print(f"❌ Error para {symbol}: {e}")
-                resultados[symbol] = None
-
-        return resultados
-
+        return cotizar(symbols, self.precio, hilos=hilos, timeout=timeout)
 
 
 if __name__ == "__main__":
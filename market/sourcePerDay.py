@@ -1,37 +1,127 @@
+import os
+import json
+import hashlib
+
 import numpy as np
 from pandas import Timestamp
 
+from market.cache import publicar_carpeta
+
+CAMPOS = ("open", "close", "high", "low", "volume")
+
 class SourcePerDay:
-    def __init__(self, source: str):
+    def __init__(self, source: str, almacen=None, bloque=64):
+        """
+        almacen: carpeta opcional donde se guardan los paneles por día como .npy
+        mapeados en memoria, para historias intradía que no caben en RAM.
+        bloque: número de símbolos que se alinean a la vez al construir los paneles.
+        """
         self.source = source
-        self.index=np.zeros(source.size,dtype=np.int16) # estos punterios apuntan al día de la fuente
         self.size=source.size
         self.symbols=source.symbols
-        self.current=Timestamp(source.fecha_inicio) 
-        self.repunteaIndex2()
+        self.almacen = almacen
+
+        # El recorrido termina cuando algún símbolo se queda sin velas
+        valido = source.valido
+        n = source.fechas_ns.size
+        ultima = n - 1 - np.argmax(valido[:, ::-1], axis=1)
+        fin = int(ultima.min()) + 1 if self.size else 0
+        self.calendario = source.fechas_ns[:fin]
+
+        if almacen is None:
+            self.filas, paneles = self._construir(source, fin, bloque)
+        else:
+            # Una carpeta por contenido del panel: si ya existe se reutiliza tal cual. Se construye
+            # en una carpeta temporal y se publica con os.replace, así nunca se reescribe un
+            # fichero que otro proceso tenga mapeado.
+            carpeta = os.path.join(almacen, self._clave(source, fin))
+            if not os.path.isdir(carpeta):
+                publicar_carpeta(carpeta, lambda temporal: self._volcar(source, fin, bloque, temporal), sustituir=False)
+            # Se abren en solo lectura para que varios procesos compartan las páginas
+            self.filas = self._abrir(carpeta, "filas")
+            paneles = {campo: self._abrir(carpeta, campo) for campo in CAMPOS}
+        self.panel_open = paneles["open"]
+        self.panel_close = paneles["close"]
+        self.panel_high = paneles["high"]
+        self.panel_low = paneles["low"]
+        self.panel_volume = paneles["volume"]  # NaN si la fuente no trae volumen
+
+        self.dia = 0
+        self.repunteaIndex()
+        self.current=Timestamp(source.fecha_inicio)
+
+    def _construir(self, source, fin, bloque, carpeta=None):
+        """
+        Matriz (fechas x símbolos) de punteros int64 a la columna del panel de Source y
+        paneles ya alineados por día: cada día es una fila contigua.
+        """
+        filas = self._reservar(carpeta, "filas", (fin, self.size), np.int64)
+        paneles = {campo: self._reservar(carpeta, campo, (fin, self.size), np.float64) for campo in CAMPOS}
+        valido = source.valido
+        posiciones = np.arange(source.fechas_ns.size, dtype=np.int64)
+        for a in range(0, self.size, bloque):
+            b = min(a + bloque, self.size)
+            # Cada símbolo apunta a su última vela <= fecha; antes de cotizar, a su primera vela.
+            columnas = np.where(valido[a:b], posiciones, -1)
+            np.maximum.accumulate(columnas, axis=1, out=columnas)
+            primera = np.argmax(valido[a:b], axis=1)
+            columnas = np.where(columnas < 0, primera[:, None], columnas)[:, :fin]
+            filas[:, a:b] = columnas.T
+            simbolos = np.arange(a, b)[:, None]
+            for campo in CAMPOS:
+                paneles[campo][:, a:b] = getattr(source, "panel_" + campo)[simbolos, columnas].T
+        return filas, paneles
+
+    def _volcar(self, source, fin, bloque, carpeta):
+        filas, paneles = self._construir(source, fin, bloque, carpeta)
+        for array in [filas, *paneles.values()]:
+            array.flush()
+
+    @staticmethod
+    def _clave(source, fin):
+        """Huella de todo lo que determina los paneles por día: símbolos, fechas, máscara y valores."""
+        h = hashlib.md5(json.dumps(list(map(str, source.symbols))).encode("utf-8"))
+        h.update(str(fin).encode())
+        for nombre in ("fechas_ns", "valido") + tuple("panel_" + c for c in CAMPOS):
+            h.update(np.ascontiguousarray(getattr(source, nombre)).tobytes())
+        return h.hexdigest()
+
+    @staticmethod
+    def _reservar(carpeta, nombre, forma, dtype):
+        if carpeta is None:
+            return np.empty(forma, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(carpeta, nombre + ".npy"), mode="w+", dtype=dtype, shape=forma)
+
+    @staticmethod
+    def _abrir(carpeta, nombre):
+        return np.load(os.path.join(carpeta, nombre + ".npy"), mmap_mode="r")
 
     def nextDay(self):
-        # Recolrre las velas y selecciona el mínimo día.
-        min_day=None
-        for i,c in enumerate(self.source.dates):
-            if len(c) <= self.index[i] + 1:
-                return False  # No hay más días disponibles
-            current=c[self.index[i]+1]
-            if min_day is None or (self.current<current and current < min_day):
-                min_day = current
-        self.current= min_day
+        if self.dia + 1 >= self.calendario.size:
+            return False  # No hay más días disponibles
+        self.dia += 1
         self.repunteaIndex()
         return True  # Se avanzó al siguiente día
-    
+
+    def estado(self):
+        """Cursor del día, con su fecha y los símbolos para comprobar que el panel es el mismo."""
+        return {"dia": self.dia, "fecha": int(self.calendario[self.dia]), "symbols": np.array(self.symbols)}
+
+    def restaurar(self, estado):
+        dia = int(estado["dia"])
+        if list(estado["symbols"]) != list(self.symbols):
+            raise ValueError("El checkpoint es de otra lista de símbolos")
+        if dia >= self.calendario.size or int(self.calendario[dia]) != int(estado["fecha"]):
+            raise ValueError(f"El día {Timestamp(int(estado['fecha'])).date()} del checkpoint no está en el calendario")
+        self.dia = dia
+        self.repunteaIndex()
+
     def repunteaIndex(self):
-        for i,c in enumerate(self.source.dates):
-            current=c[self.index[i]+1]
-            if current== self.current:
-                self.index[i] += 1
-        self.repunteaIndex2()
-        
-    def repunteaIndex2(self):
-        self.open=[self.source.open[i][j] for i,j in enumerate(self.index)]
-        self.close=[self.source.close[i][j] for i,j in enumerate(self.index)]
-        self.high=[self.source.high[i][j] for i,j in enumerate(self.index)]
-        self.low=[self.source.low[i][j] for i,j in enumerate(self.index)]
+        # Vistas O(1) de la fila del día, sin recorrer símbolos
+        self.index = self.filas[self.dia]  # estos punteros apuntan al día de la fuente
+        self.current = Timestamp(int(self.calendario[self.dia]))
+        self.open = self.panel_open[self.dia]
+        self.close = self.panel_close[self.dia]
+        self.high = self.panel_high[self.dia]
+        self.low = self.panel_low[self.dia]
+        self.volume = self.panel_volume[self.dia]
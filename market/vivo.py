@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+
+from pandas import Timestamp
+
+from market.cache import escribir_atomico
+from market.checkpoint import guardar_checkpoint, cargar_checkpoint
+
+
+def programar(simulator, orders):
+    """Programa en el simulador una respuesta de StrategyClient.open."""
+    for order in orders["programBuy"]:
+        simulator.programBuy(order["id"], order["price"], order["amount"])
+    for order in orders["programSell"]:
+        simulator.programSell(order["id"], order["price"], order["amount"])
+
+
+def avanzar(simulator, sp, strategy, abierto=False, alCerrarDia=None, bloque=None, alCerrarBloque=None,
+            alPedir=None):
+    """
+    Simula desde el día actual de `sp` hasta el último del calendario: open en la estrategia,
+    execute en la estrategia y en el simulador. Si `abierto`, el primer día ya se abrió en la
+    ejecución anterior (las órdenes en vivo están en el libro del simulador) y solo se cierra.
+
+    Con `bloque` las órdenes se piden con strategy.replay de `bloque` días en `bloque` días
+    (una petición por bloque en vez de dos por día) y el simulador las aplica después.
+    alCerrarDia(tasacion) se llama tras cada día y alCerrarBloque(tasacion) cuando la sesión
+    remota y el simulador están en el mismo día (cada día sin `bloque`), que es cuando se
+    puede guardar un checkpoint. alPedir(desde, hasta) se llama antes de cada petición que
+    hace avanzar la sesión remota por esos días (EstadoVivo.pendiente): si el proceso cae
+    antes del siguiente alCerrarBloque, el checkpoint ya no coincide con la sesión.
+    Devuelve la última tasación.
+    """
+    tasacion = None
+    hay = True
+    if abierto:
+        if alPedir is not None:
+            alPedir(sp.current, sp.current)
+        strategy.execute(sp.low, sp.high, sp.close, sp.current)
+        tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current, sp.volume)
+        for llamada in (alCerrarDia, alCerrarBloque):
+            if llamada is not None:
+                llamada(tasacion)
+        hay = sp.nextDay()
+    while hay:
+        if bloque is None:
+            if alPedir is not None:
+                alPedir(sp.current, sp.current)
+            ordenes = [strategy.open(sp.open)]
+            strategy.execute(sp.low, sp.high, sp.close, sp.current)
+        else:
+            dias = slice(sp.dia, min(sp.dia + bloque, sp.calendario.size))
+            fechas = [sp.current] + [Timestamp(int(f)) for f in sp.calendario[dias][1:]]
+            if alPedir is not None:
+                alPedir(fechas[0], fechas[-1])
+            ordenes = strategy.replay(sp.panel_open[dias], sp.panel_low[dias], sp.panel_high[dias],
+                                      sp.panel_close[dias], fechas, bloque=bloque)
+        for k, orders in enumerate(ordenes):
+            if k:
+                sp.nextDay()
+            programar(simulator, orders)
+            tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current, sp.volume)
+            if alCerrarDia is not None:
+                alCerrarDia(tasacion)
+        if alCerrarBloque is not None:
+            alCerrarBloque(tasacion)
+        hay = sp.nextDay()
+    return tasacion
+
+
+async def avanzar_async(simulator, sp, sesiones, alCerrarDia=None):
+    """
+    Como avanzar, con clientes asíncronos (strategyClientAsync). Cada día se piden a la vez los open de
+    todas las sesiones y después el execute remoto de todas se solapa con Simulator.execute,
+    que corre en un hilo. El open del día siguiente espera a que el execute haya terminado,
+    porque el servidor necesita cerrar el día antes de abrir el siguiente.
+    Con una sesión, `simulator` es un Simulator; con varias, un SimulatorMulti (cartera k = sesión k).
+    """
+    multi = hasattr(simulator, "programOrders")
+    tasacion = None
+    while True:
+        ordenes = await asyncio.gather(*(s.open(sp.open) for s in sesiones))
+        for k, orders in enumerate(ordenes):
+            if multi:
+                simulator.programOrders(k, orders)
+            else:
+                programar(simulator, orders)
+        remoto = asyncio.gather(*(s.execute(sp.low, sp.high, sp.close, sp.current) for s in sesiones))
+        local = asyncio.to_thread(simulator.execute, sp.low, sp.high, sp.close, sp.current, sp.volume)
+        _, tasacion = await asyncio.gather(remoto, local)
+        if alCerrarDia is not None:
+            alCerrarDia(tasacion)
+        if not sp.nextDay():
+            return tasacion
+
+
+class EstadoVivo:
+    """
+    Estado persistente del modo diario en vivo: simulador, cursor de SourcePerDay y sesión
+    de la estrategia tras el último día cerrado, en un checkpoint (market.checkpoint).
+
+    Cada ejecución diaria restaura el estado, simula solo las velas nuevas y pide las órdenes
+    de hoy. `abierto` indica que tras el último día cerrado se hizo ese open en vivo: la
+    sesión remota espera el execute de esa vela, sus órdenes ya están en el simulador y se
+    guardan en `ordenes` para volver a enviarlas si se repite la ejecución antes de la vela,
+    pero solo el mismo día del open (`fecha_open`). Antes de cada open en vivo el simulador se
+    ajusta a la cartera del broker (Simulator.sincronizar), que es la que recibe la sesión: una
+    ejecución reanudada sigue la cartera real y no coincide con repetir toda la historia.
+    El checkpoint solo vale para la misma configuración (sin contar la fecha de fin) y el
+    mismo universo y calendario; si no, se ignora y se repite toda la historia.
+
+    Antes de cada petición que avanza la sesión remota se deja una marca (pendiente) que el
+    siguiente guardar borra. Si al restaurar sigue ahí, el proceso cayó con una petición en
+    vuelo: la sesión pudo haber visto días que el checkpoint no tiene, así que se descarta.
+    """
+    IGNORADAS = ("fecha_fin", "key", "email", "tickers")
+
+    def __init__(self, ruta, config):
+        self.ruta = ruta
+        self.config = json.dumps({k: v for k, v in config.items() if k not in self.IGNORADAS}, sort_keys=True)
+
+    def pendiente(self, desde, hasta):
+        """Marca que se van a enviar a la sesión remota los días de `desde` a `hasta`."""
+        marca = json.dumps({"desde": str(desde), "hasta": str(hasta)})
+        escribir_atomico(self.ruta + ".pendiente", marca.encode("utf-8"))
+
+    def guardar(self, simulator, sp, strategy, tasacion, abierto=False, ordenes=None, fecha_open=None):
+        guardar_checkpoint(self.ruta, simulator=simulator.estado(), source=sp.estado(), strategy=strategy.estado(),
+                           vivo={"config": self.config, "tasacion": tasacion if tasacion is not None else 0,
+                                 "abierto": abierto, "fecha_open": fecha_open or "",
+                                 "ordenes": json.dumps(ordenes, default=lambda v: v.item())})
+        # El checkpoint ya recoge todo lo enviado: no queda ninguna petición en vuelo
+        if os.path.exists(self.ruta + ".pendiente"):
+            os.remove(self.ruta + ".pendiente")
+
+    def restaurar(self, simulator, sp):
+        """
+        Restaura simulador y cursor y devuelve {"session_id", "tasacion", "abierto", "ordenes",
+        "fecha_open"};
+        None si no hay checkpoint, es de otra configuración, quedó una petición en vuelo o no
+        encaja con los símbolos o el calendario de `sp` (en esos casos no se toca nada).
+        """
+        if os.path.exists(self.ruta + ".pendiente"):
+            with open(self.ruta + ".pendiente", encoding="utf-8") as f:
+                marca = json.load(f)
+            print(f"⚠️ Checkpoint descartado: la sesión remota pudo recibir {marca['desde']} - {marca['hasta']} sin guardarse")
+            return None
+        checkpoint = cargar_checkpoint(self.ruta)
+        if checkpoint is None or "vivo" not in checkpoint or str(checkpoint["vivo"]["config"]) != self.config:
+            return None
+        try:
+            # Ambos comprueban antes de modificar nada; con los mismos símbolos la forma coincide
+            sp.restaurar(checkpoint["source"])
+            simulator.restaurar(checkpoint["simulator"])
+        except (ValueError, KeyError) as error:
+            print(f"⚠️ Checkpoint descartado: {error}")
+            return None
+        vivo = checkpoint["vivo"]
+        return {
+            "session_id": str(checkpoint["strategy"]["session_id"]),
+            "tasacion": float(vivo["tasacion"]),
+            "abierto": bool(vivo["abierto"]),
+            "ordenes": json.loads(str(vivo["ordenes"])) if "ordenes" in vivo else None,
+            "fecha_open": (str(vivo["fecha_open"]) or None) if "fecha_open" in vivo else None,
+        }
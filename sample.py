@@ -1,8 +1,9 @@
-from market.source import Source
+from market.source import Source, tickers_sp500
 from market.sourcePerDay import SourcePerDay
 import numpy as np
 import pandas as pd
 from market.simulator import Simulator
+from market.vivo import EstadoVivo, avanzar, programar
 from market.evaluacion import EstrategiaValuacionConSP500 as EstrategiaValuacion
 from strategyClient import StrategyClient as Strategy
 from utils.telegram_utils import TelegramBot
@@ -10,6 +11,7 @@ import time
 from datetime import datetime, timedelta
 from utils.summary import paint_graphs, resume, save_resume  # Importar la función corregida
 import os
+import requests
 from dotenv import load_dotenv
 
 # Cargar las variables del archivo .env
@@ -19,14 +21,18 @@ API_KEY = os.getenv("API_KEY")
 
 bot = TelegramBot()
 
+base_dir = os.path.abspath(os.path.dirname(__file__))
+# Estado tras el último día cerrado: cada ejecución diaria (o tras un fallo) continúa desde ahí
+CHECKPOINT = os.path.join(base_dir, "checkpoint.npz")
+BLOQUE_REPLAY = 252
+# Fracción máxima del volumen de cada vela que puede ejecutar una orden simulada (None: sin límite)
+PARTICIPACION = None
+
 try:
 
     bot.send_message("💵 *Lanzando estrategia en entorno real...*")
-    # Leer la tabla de Wikipedia
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    tablas = pd.read_html(url)
-    sp500 = tablas[0]
-    tickers = sp500['Symbol'].tolist()
+    # Leer la tabla de Wikipedia (cacheada un día)
+    tickers = tickers_sp500()
 
     today = pd.Timestamp.now().normalize()
     stoday = today.strftime("%Y-%m-%d")
@@ -55,26 +61,54 @@ try:
         intervalo="1d"
     )
 
-    sp = SourcePerDay(source)
-    p["tickers"] = sp.symbols
-
-    simulator = Simulator(sp.symbols)
-    simulator.money = p["money"]
-    s = Strategy(p)
+    p["tickers"] = source.symbols
+    vivo = EstadoVivo(CHECKPOINT, p)
+
+    def simular(reanudar):
+        sp = SourcePerDay(source)
+        simulator = Simulator(sp.symbols, participacion=PARTICIPACION)
+        simulator.money = p["money"]
+        estado = vivo.restaurar(simulator, sp) if reanudar else None
+        s = Strategy(p, session_id=estado["session_id"]) if estado else Strategy(p)
+
+        def cerrarDia(tasacion):
+            ev.add(sp.current, tasacion)
+
+        def guardar(tasacion):
+            vivo.guardar(simulator, sp, s, tasacion)
+
+        # Las órdenes históricas se piden en bloques de un año si el servidor lo soporta
+        def hasta_hoy(abierto=False):
+            return avanzar(simulator, sp, s, abierto=abierto, alCerrarDia=cerrarDia, bloque=BLOQUE_REPLAY,
+                           alCerrarBloque=guardar, alPedir=vivo.pendiente)
+
+        if estado is None:
+            return sp, simulator, s, hasta_hoy(), None
+        # Solo se simulan las velas posteriores al último día cerrado
+        bot.send_message(f"♻️ *Reanudando desde el {sp.current.date()}*")
+        tasacion = estado["tasacion"]
+        if sp.nextDay():
+            return sp, simulator, s, hasta_hoy(estado["abierto"]), None
+        if not estado["abierto"]:
+            return sp, simulator, s, tasacion, None
+        # Sin vela nueva (reintento, segunda ejecución del día): si el open se hizo hoy la sesión
+        # espera su execute, así que no se vuelve a abrir y se reenvían sus órdenes. Si es de otro
+        # día falta la vela de ese open (calendario recortado, festivo...): no se envía nada
+        if estado["fecha_open"] != stoday:
+            raise RuntimeError(f"La sesión espera el execute del open del {estado['fecha_open']} "
+                               f"y no hay vela nueva: no se reenvían órdenes de otro día")
+        return sp, simulator, s, tasacion, estado["ordenes"]
 
     ev = EstrategiaValuacion()
-    while True:
-        orders = s.open(sp.open)
-        for order in orders["programBuy"]:
-            simulator.programBuy(order["id"], order["price"], order["amount"])
-        for order in orders["programSell"]:
-            simulator.programSell(order["id"], order["price"], order["amount"])
-        s.execute(sp.low, sp.high, sp.close, sp.current)
-        tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current)
-        ev.add(sp.current, tasacion)
-        hay = sp.nextDay()
-        if not hay:
-            break
+    try:
+        sp, simulator, s, tasacion, orders = simular(reanudar=True)
+    except requests.HTTPError as e:
+        if not os.path.exists(CHECKPOINT) or e.response is None or e.response.status_code != 404:
+            raise
+        # La sesión del checkpoint ya no existe en el servidor: se repite toda la historia
+        bot.send_message("⚠️ *Sesión caducada, repitiendo la simulación completa*")
+        ev = EstrategiaValuacion()
+        sp, simulator, s, tasacion, orders = simular(reanudar=False)
 
     # ev.print()
     bot.send_message("📡 *Conectando a IB Gateway...*")
@@ -84,8 +118,19 @@ try:
     d.conectar()
     bot.send_message("✅ *Conectado a IB Gateway.*")
 
-    s.set_profolio(d.cash(), d.profolio(sp.symbols))
-    orders = s.open(source.realTime(sp.symbols))
+    if orders is None:
+        cash, cartera = d.cash(), d.profolio(sp.symbols)
+        # La sesión opera desde la cartera real: el simulador se ajusta a ella para que el
+        # execute de mañana parta en ambos lados del mismo efectivo y posiciones
+        simulator.sincronizar(cash, cartera)
+        vivo.pendiente(today, today)
+        s.set_portfolio(cash, cartera)
+        orders = s.open(source.realTime(sp.symbols))
+        # La sesión queda abierta en el día de hoy: mañana solo falta cerrarlo con su vela
+        programar(simulator, orders)
+        vivo.guardar(simulator, sp, s, tasacion, abierto=True, ordenes=orders, fecha_open=stoday)
+    else:
+        bot.send_message("♻️ *Las órdenes de hoy ya estaban calculadas: se vuelven a enviar*")
     d.clearOrders()
 
     msg = f"📆 *Órdenes del día {datetime.now().strftime('%Y-%m-%d')}*\n\n"
@@ -114,9 +159,11 @@ try:
 
 
     save_resume(simulator, sp, tasacion, p)
+    # Tiempos y bytes de las llamadas al servidor de estrategia
+    print(s.metricas.resumen())
+    s.metricas.exportar(os.path.join(base_dir, "results", "metricas_cliente.json"))
     bot.send_message("✅ *🟢 Operativa completada exitosamente*")
 
-    base_dir = os.path.abspath(os.path.dirname(__file__))
     csv_path = os.path.join(base_dir, "tests.csv")
     results_dir = os.path.join(base_dir, "results")
 
@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import asyncio
+from types import SimpleNamespace
+from market.source import Source, tickers_sp500
+from market.sourcePerDay import SourcePerDay
+from market.simulator import SimulatorMulti
+from market.informe import InformeRegistro
+from market.vivo import avanzar_async
+from strategyClient import StrategyClient as Strategy
+from utils.summary import save_resume
+from utils.instrumentacion import MetricasCliente
+from simulate.simulateMulti import construir_parametros
+
+# Alternativa a launcher.py: todas las configuraciones en un solo proceso.
+# Los datos se cargan una vez y un SimulatorMulti avanza todas las carteras en cada día.
+CONFIG_DIR = os.path.abspath(os.path.dirname(__file__))
+
+async def sesiones_async(ps, simulator, sp, metricas):
+    # Todas las sesiones comparten una piscina de conexiones (HTTP/2 si hay h2)
+    from strategyClientAsync import StrategyClientAsync, cliente_compartido
+    async with cliente_compartido() as cliente:
+        sesiones = await asyncio.gather(*(StrategyClientAsync.crear(p, cliente=cliente, metricas=metricas)
+                                           for p in ps))
+        return await avanzar_async(simulator, sp, sesiones)
+
+def main(configs, asincrono=False):
+    tickers = tickers_sp500()
+    ps = [construir_parametros(config) for config in configs]
+
+    source = Source(tickers, ps[0]["fecha_inicio"], ps[0]["fecha_fin"], intervalo="1d")
+    sp = SourcePerDay(source)
+    for p in ps:
+        p["tickers"] = sp.symbols
+
+    informe = InformeRegistro()
+    simulator = SimulatorMulti(sp.symbols, len(ps), money=[p["money"] for p in ps], informe=informe)
+    # Tiempos y bytes de las llamadas de todas las sesiones juntas
+    cliente = MetricasCliente()
+    if asincrono:
+        tasacion = asyncio.run(sesiones_async(ps, simulator, sp, cliente))
+    else:
+        sesiones = [Strategy(p, metricas=cliente) for p in ps]
+        while True:
+            for k, s in enumerate(sesiones):
+                simulator.programOrders(k, s.open(sp.open))
+                s.execute(sp.low, sp.high, sp.close, sp.current)
+            tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current, sp.volume)
+            if not sp.nextDay():
+                break
+
+    metricas = informe.metricas()
+    for k, p in enumerate(ps):
+        cartera = SimpleNamespace(
+            initialDate=simulator.initialDate,
+            initialMoney=float(simulator.initialMoney[k]),
+            totalComision=float(simulator.totalComision[k]),
+        )
+        save_resume(cartera, sp, float(tasacion[k]), p)
+        print(f"✔️ {configs[k]} valor final: ${informe.curva()[-1, k]:.0f} "
+              f"Sharpe: {metricas['sharpe'][k]:.2f} Max DD: {metricas['max_drawdown'][k]:.2%}")
+    print(cliente.resumen())
+    cliente.exportar(os.path.join(CONFIG_DIR, "..", "results", "metricas_cliente_batch.json"))
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=os.path.join(CONFIG_DIR, "config_tests.json"))
+    parser.add_argument("--asincrono", action="store_true", help="cliente asíncrono con httpx (sesiones en paralelo)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        main(json.load(f), args.asincrono)
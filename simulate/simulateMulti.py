@@ -4,11 +4,13 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import numpy as np
 import pandas as pd
 from datetime import datetime
-from market.source import Source
+from market.source import Source, tickers_sp500
 from market.sourcePerDay import SourcePerDay
 from market.simulator import Simulator
+from market.informe import INFORMES
 from market.evaluacion import EstrategiaValuacionConSP500 as EstrategiaValuacion
-from strategyClient import StrategyClient as Strategy
+from strategyClient import StrategyClient as Strategy, StrategyClientGrabado
+from utils.grabacion import MODOS
 from utils.summary import save_resume
 from dotenv import load_dotenv
 
@@ -17,15 +19,11 @@ load_dotenv()
 EMAIL = os.getenv("EMAIL")
 API_KEY = os.getenv("API_KEY")
 
-def main(params):
-    url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-    sp500 = pd.read_html(url)[0]
-    tickers = sp500['Symbol'].tolist()
-
+def construir_parametros(params):
     today = pd.Timestamp.now().normalize()
     stoday = today.strftime("%Y-%m-%d")
 
-    p = {
+    return {
         "fecha_inicio": "2019-01-01",
         "fecha_fin": stoday,
         "money": float(params.get("money", 100000)),
@@ -43,13 +41,22 @@ def main(params):
         "email": EMAIL
     }
 
+def main(params):
+    tickers = tickers_sp500()
+    p = construir_parametros(params)
+
     source = Source(tickers, p["fecha_inicio"], p["fecha_fin"], intervalo="1d")
     sp = SourcePerDay(source)
     p["tickers"] = sp.symbols
 
-    simulator = Simulator(sp.symbols)
+    simulator = Simulator(sp.symbols, informe=INFORMES[params.get("informe", "periodico")](),
+                          participacion=params.get("participacion"))
     simulator.money = p["money"]
-    s = Strategy(p)
+    if params.get("grabacion"):
+        # Mismas respuestas sin red si ya se ejecutó esta configuración con estos datos
+        s = StrategyClientGrabado(p, archivo=params.get("archivo_grabacion"), modo=params["grabacion"])
+    else:
+        s = Strategy(p)
 
     while True:
         orders = s.open(sp.open)
@@ -58,11 +65,14 @@ def main(params):
         for order in orders["programSell"]:
             simulator.programSell(order["id"], order["price"], order["amount"])
         s.execute(sp.low, sp.high, sp.close, sp.current)
-        tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current)
+        tasacion = simulator.execute(sp.low, sp.high, sp.close, sp.current, sp.volume)
         if not sp.nextDay():
             break
 
     save_resume(simulator, sp, tasacion, p)
+    # Tiempos y bytes de las llamadas al servidor de estrategia
+    print(s.metricas.resumen())
+    s.metricas.exportar(os.path.join(os.path.dirname(__file__), "..", "results", "metricas_cliente.json"))
 
 if __name__ == "__main__":
     import argparse
@@ -76,6 +86,11 @@ if __name__ == "__main__":
     parser.add_argument("--rlog_size", type=int, default=24)
     parser.add_argument("--ring_size", type=int, default=240)
     parser.add_argument("--money", type=float, default=100000)
+    parser.add_argument("--informe", choices=sorted(INFORMES), default="periodico")
+    parser.add_argument("--participacion", type=float, default=None,
+                        help="fracción máxima del volumen de cada vela que puede ejecutar una orden")
+    parser.add_argument("--grabacion", choices=MODOS, default=None, help="graba/reproduce las respuestas del servidor")
+    parser.add_argument("--archivo_grabacion", default=None)
 
     args = vars(parser.parse_args())
     main(args)
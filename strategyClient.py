@@ -1,13 +1,131 @@
 import requests
-from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import warnings
+import os
+import time
+import numpy as np
 
+from utils import binario, grabacion
+from utils.instrumentacion import AdaptadorMedido, MetricasCliente, reiniciar_conexion, tiempo_conexion
+from market.cache import directorio_cache
 
-class StrategyClient:
-    def __init__(self,p):
+
+def correr(pasos, enviar):
+    """Ejecuta un generador de pasos de ClienteEstrategia: cada petición que cede va a `enviar`."""
+    try:
+        peticion = next(pasos)
+        while True:
+            peticion = pasos.send(enviar(*peticion))
+    except StopIteration as fin:
+        return fin.value
+
+
+async def correr_async(pasos, enviar):
+    """Como correr, con `enviar` corrutina."""
+    try:
+        peticion = next(pasos)
+        while True:
+            peticion = pasos.send(await enviar(*peticion))
+    except StopIteration as fin:
+        return fin.value
+
+
+class ClienteEstrategia:
+    """
+    Lógica común de StrategyClient y StrategyClientAsync, sin E/S. Cada operación es un
+    generador que cede las peticiones y recibe sus respuestas; correr y correr_async lo
+    ejecutan. Los _pasos_* ceden (ruta, payload), que cada cliente envía con su _post, y
+    _pasos_post cede (ruta, url, kwargs de requests), que cada cliente envía con su _enviar.
+    """
+    # Códigos con los que un servidor sin /replay rechaza la ruta
+    SIN_REPLAY = (404, 405, 501)
+    # Códigos con los que un servidor rechaza un cuerpo binario que no entiende
+    SIN_BINARIO = (415, 422)
+
+    def _pasos_post(self, ruta, payload):
+        url = f"{self.api_url}/sessions/{self.session_id}/{ruta}"
+        if self.binario:
+            cabeceras = {"Content-Type": binario.CONTENT_TYPE,
+                         "Accept": f"{binario.CONTENT_TYPE}, application/json;q=0.9"}
+            resp = yield ruta, url, {"data": binario.codificar(payload, self.dtype), "headers": cabeceras}
+            if resp.status_code not in self.SIN_BINARIO:
+                return resp
+            self.binario = False
+        return (yield ruta, url, {"json": self._a_json(payload)})
+
+    @staticmethod
+    def _a_json(payload):
+        return {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in payload.items()}
+
+    @staticmethod
+    def _leer(resp):
+        if resp.headers.get("Content-Type", "").startswith(binario.CONTENT_TYPE):
+            return binario.decodificar(resp.content, listas=True)
+        return resp.json()
+
+    def estado(self):
+        return {"session_id": self.session_id or ""}
+
+    def _llamada(self, ruta, payload):
+        if not self.session_id:
+            raise Exception("Session not created")
+        resp = yield ruta, payload
+        resp.raise_for_status()
+        return self._leer(resp)
+
+    def _pasos_open(self, open20):
+        return self._llamada("open", {"open20": np.asarray(open20)})  # {'programSell': [...], 'programBuy': [...]}
+
+    def _pasos_execute(self, low, high, close, date):
+        payload = {
+            "low": np.asarray(low),
+            "high": np.asarray(high),
+            "close": np.asarray(close),
+            "date": str(date)  # Puede ser datetime.isoformat()
+        }
+        return self._llamada("execute", payload)  # {'success': True}
+
+    def _pasos_set_portfolio(self, cash, portfolio):
+        return self._llamada("set_portfolio", {"cash": cash, "portfolio": portfolio})
+
+    def _pasos_replay(self, opens, lows, highs, closes, dates, bloque):
+        if not self.session_id:
+            raise Exception("Session not created")
+        orders = []
+        for a in range(0, len(dates), bloque):
+            b = min(a + bloque, len(dates))
+            if self.bulk:
+                payload = {
+                    "open": np.asarray(opens[a:b]),
+                    "low": np.asarray(lows[a:b]),
+                    "high": np.asarray(highs[a:b]),
+                    "close": np.asarray(closes[a:b]),
+                    "dates": [str(date) for date in dates[a:b]]
+                }
+                resp = yield "replay", payload
+                if resp.status_code not in self.SIN_REPLAY:
+                    resp.raise_for_status()
+                    orders.extend(self._leer(resp)["orders"])  # [{'programSell': [...], 'programBuy': [...]}, ...]
+                    continue
+                self.bulk = False
+            for t in range(a, b):
+                orders.append((yield from self._pasos_open(opens[t])))
+                yield from self._pasos_execute(lows[t], highs[t], closes[t], dates[t])
+        return orders
+
+
+class StrategyClient(ClienteEstrategia):
+    def __init__(self,p,session_id=None,api_url=None,binario=False,dtype="<f8",metricas=None):
+        """
+        session_id: reutiliza una sesión ya creada (p. ej. la de un checkpoint) en vez de crear otra.
+        api_url: servidor alternativo (p. ej. un stub local para pruebas).
+        binario: envía los arrays en el formato compacto de utils.binario (floats `dtype`,
+        comprimidos) y lo acepta en las respuestas. Si el servidor lo rechaza se vuelve a JSON.
+        metricas: MetricasCliente donde se anotan tiempos, bytes y reintentos de cada petición
+        (por defecto uno propio en self.metricas; varias sesiones pueden compartir uno).
+        """
         self.verify_ssl = True  
-        api_url="https://pyroboadvisor.org"
+        api_url=api_url or "https://pyroboadvisor.org"
         if self.verify_ssl is False:
             api_url="https://localhost:443"
             warnings.filterwarnings(
@@ -17,59 +135,121 @@ class StrategyClient:
         self.api_url = api_url.rstrip("/")
         # Create requests session to handle ConnectionError
         self.requests_session = self.configure_requests_session(retries=3, backof_factor=0.5)
-        self.session_id = None
-        self.create_session(p)
+        self.session_id = session_id
+        self.bulk = True  # se desactiva si el servidor no soporta /replay
+        self.binario = binario
+        self.dtype = dtype
+        self.metricas = metricas if metricas is not None else MetricasCliente()
+        if session_id is None:
+            self.create_session(p)
 
     def configure_requests_session(self, retries: int, backof_factor: float) -> requests.Session:
         session = requests.Session()
         retry = Retry(connect=retries, backoff_factor=backof_factor)
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = AdaptadorMedido(max_retries=retry)
         session.mount('http://', adapter)
         session.mount('https://', adapter)
         return session
     
     def create_session(self, config: dict):
-        resp = self.requests_session.post(f"{self.api_url}/sessions", json={"config": config,"email": config["email"],
-            "license_key": config["key"]},verify=self.verify_ssl)
+        resp = self._enviar("sessions", f"{self.api_url}/sessions", json={"config": config,"email": config["email"],
+            "license_key": config["key"]})
         resp.raise_for_status()
         self.session_id = resp.json()["session_id"]
         return self.session_id
 
+    def _post(self, ruta, payload):
+        return correr(self._pasos_post(ruta, payload), lambda ruta, url, kwargs: self._enviar(ruta, url, **kwargs))
+
+    def _enviar(self, endpoint, url, **kwargs):
+        """POST medido: conexión, primer byte (resp.elapsed), total, bytes y reintentos."""
+        reiniciar_conexion()
+        inicio = time.perf_counter()
+        resp = self.requests_session.post(url, verify=self.verify_ssl, **kwargs)
+        total = time.perf_counter() - inicio
+        reintentos = resp.raw.retries if resp.raw is not None else None
+        self.metricas.registrar(endpoint, tiempo_conexion(), resp.elapsed.total_seconds(), total,
+                                len(resp.request.body or b""), len(resp.content),
+                                len(reintentos.history) if reintentos is not None else 0, resp.status_code)
+        return resp
+
     def open(self, open20):
-        if not self.session_id:
-            raise Exception("Session not created")
-        payload = {"open20": list(open20)}
-        resp = self.requests_session.post(f"{self.api_url}/sessions/{self.session_id}/open", json=payload, verify=self.verify_ssl)
-        resp.raise_for_status()
-        return resp.json()  # {'programSell': [...], 'programBuy': [...]}
+        return correr(self._pasos_open(open20), self._post)
 
     def execute(self, low, high, close, date):
-        if not self.session_id:
-            raise Exception("Session not created")
-        payload = {
-            "low": list(low),
-            "high": list(high),
-            "close": list(close),
-            "date": str(date)  # Puede ser datetime.isoformat()
-        }
-        resp = self.requests_session.post(f"{self.api_url}/sessions/{self.session_id}/execute", json=payload, verify=self.verify_ssl)
-        resp.raise_for_status()
-        return resp.json()  # {'success': True}
+        return correr(self._pasos_execute(low, high, close, date), self._post)
+
+    def replay(self, opens, lows, highs, closes, dates, bloque=250):
+        """
+        Repite varios días seguidos en el servidor (open y execute de cada uno) y devuelve la
+        lista de órdenes de cada día. Los paneles son (días x símbolos) y se envían en bloques
+        de `bloque` días. Si el servidor no tiene /replay se hace día a día con open/execute.
+        """
+        return correr(self._pasos_replay(opens, lows, highs, closes, dates, bloque), self._post)
 
     def set_portfolio(self, cash, portfolio):
-        if not self.session_id:
-            raise Exception("Session not created")
-        payload = {
-            "cash": cash,
-            "portfolio": portfolio
-        }
-        resp = self.requests_session.post(f"{self.api_url}/sessions/{self.session_id}/set_portfolio", json=payload, verify=self.verify_ssl)
-        resp.raise_for_status()
-        return resp.json()
+        return correr(self._pasos_set_portfolio(cash, portfolio), self._post)
 
     # def program_orders(self, orders, simulator):
     #     # Utiliza el mismo simulador que el bucle original
     #     for order in orders.get("programBuy", []):
     #         simulator.programBuy(order["id"], order["price"], order["amount"])
     #     for order in orders.get("programSell", []):
-    #         simulator.programSell(order["id"], order["price"], order["amount"])
\ No newline at end of file
+    #         simulator.programSell(order["id"], order["price"], order["amount"])
+
+
+class StrategyClientGrabado(StrategyClient):
+    """
+    StrategyClient con grabación/reproducción de respuestas (utils.grabacion) en un fichero
+    JSONL de solo añadir, con clave encadenada por configuración, ruta y payload.
+
+    modo "grabar": todo va al servidor y se graba. "reproducir": solo del fichero, sin red;
+    una petición no grabada es un error (salvo /replay, que responde 404 para que el cliente
+    siga día a día). "auto": del fichero mientras haya respuesta; en el primer fallo se crea
+    la sesión remota, se le reenvían las peticiones ya servidas desde el fichero y se sigue
+    contra el servidor grabando.
+    """
+    def __init__(self, p, archivo=None, modo="auto", **kwargs):
+        if modo not in grabacion.MODOS:
+            raise ValueError(f"modo debe ser uno de {grabacion.MODOS}")
+        self.config = p
+        self.modo = modo
+        self.registro = grabacion.RegistroRespuestas(archivo or os.path.join(directorio_cache(), "respuestas.jsonl"))
+        self.cadena = grabacion.huella_config(p)
+        self.servidas = []  # peticiones respondidas desde el fichero que el servidor aún no ha visto
+        self.conectado = False
+        super().__init__(p, **kwargs)
+
+    def create_session(self, config: dict):
+        if self.modo == "grabar":
+            return self._conectar()
+        self.session_id = "grabada"  # la sesión remota se crea solo si hace falta
+        return self.session_id
+
+    def _conectar(self):
+        super().create_session(self.config)
+        self.conectado = True
+        for ruta, payload in self.servidas:
+            super()._post(ruta, payload).raise_for_status()
+        self.servidas = []
+        return self.session_id
+
+    def _post(self, ruta, payload):
+        # Solo las peticiones aceptadas avanzan la cadena: un rechazo no cambia la sesión remota
+        clave = grabacion.huella(self.cadena, ruta, payload)
+        if self.modo != "grabar" and not self.conectado:
+            respuesta = self.registro.buscar(clave)
+            if respuesta is not None:
+                self.cadena = clave
+                self.servidas.append((ruta, payload))
+                return grabacion.RespuestaGrabada(respuesta)
+            if self.modo == "reproducir":
+                if ruta == "replay":
+                    return grabacion.RespuestaGrabada(None, 404)
+                raise KeyError(f"No hay respuesta grabada para /{ruta} en {self.registro.archivo}")
+            self._conectar()
+        resp = super()._post(ruta, payload)
+        if resp.ok:
+            self.cadena = clave
+            self.registro.agregar(clave, ruta, self._leer(resp))
+        return resp
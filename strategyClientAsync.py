@@ -0,0 +1,87 @@
+import time
+
+from strategyClient import ClienteEstrategia, correr_async
+from utils.instrumentacion import MetricasCliente
+
+# Dependencia opcional: pip install "httpx[http2]"
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+def cliente_compartido(max_conexiones=20, timeout=30.0, reintentos=3):
+    """
+    AsyncClient para compartir entre todas las sesiones de un proceso: una sola piscina de
+    conexiones keep-alive y, si está instalado h2, HTTP/2 con las peticiones multiplexadas.
+    """
+    if httpx is None:
+        raise ImportError("StrategyClientAsync necesita httpx: pip install \"httpx[http2]\"")
+    limites = httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones)
+    try:
+        transporte = httpx.AsyncHTTPTransport(http2=True, retries=reintentos, limits=limites)
+    except ImportError:  # sin h2 se queda en HTTP/1.1 keep-alive
+        transporte = httpx.AsyncHTTPTransport(retries=reintentos, limits=limites)
+    return httpx.AsyncClient(timeout=timeout, transport=transporte)
+
+
+class StrategyClientAsync(ClienteEstrategia):
+    """
+    Versión asyncio de StrategyClient con la misma API (open, execute, replay, set_portfolio)
+    en corrutinas. Se crea con `await StrategyClientAsync.crear(p)`. Varias sesiones pueden
+    compartir `cliente` (cliente_compartido) y `metricas`, y avanzar a la vez con asyncio.gather.
+    """
+    def __init__(self, session_id=None, api_url=None, cliente=None, binario=False, dtype="<f8", metricas=None):
+        self.api_url = (api_url or "https://pyroboadvisor.org").rstrip("/")
+        self.cliente = cliente if cliente is not None else cliente_compartido()
+        self.session_id = session_id
+        self.bulk = True
+        self.binario = binario
+        self.dtype = dtype
+        self.metricas = metricas if metricas is not None else MetricasCliente()
+
+    @classmethod
+    async def crear(cls, p, session_id=None, **kwargs):
+        cliente = cls(session_id=session_id, **kwargs)
+        if session_id is None:
+            await cliente.create_session(p)
+        return cliente
+
+    async def create_session(self, config: dict):
+        resp = await self._enviar("sessions", f"{self.api_url}/sessions", json={"config": config, "email": config["email"],
+            "license_key": config["key"]})
+        resp.raise_for_status()
+        self.session_id = resp.json()["session_id"]
+        return self.session_id
+
+    async def _post(self, ruta, payload):
+        return await correr_async(self._pasos_post(ruta, payload),
+                                  lambda ruta, url, kwargs: self._enviar(ruta, url, **kwargs))
+
+    async def _enviar(self, endpoint, url, data=None, **kwargs):
+        """
+        POST medido como StrategyClient._enviar. La conexión sale de una piscina compartida (y
+        con HTTP/2 multiplexada), así que su tiempo no se separa: va dentro del primer byte.
+        Los reintentos del transporte de httpx no se ven desde aquí.
+        """
+        inicio = time.perf_counter()
+        async with self.cliente.stream("POST", url, content=data, **kwargs) as resp:
+            ttfb = time.perf_counter() - inicio
+            await resp.aread()
+        total = time.perf_counter() - inicio
+        self.metricas.registrar(endpoint, 0.0, ttfb, total, len(resp.request.content), len(resp.content),
+                                0, resp.status_code)
+        return resp
+
+    async def open(self, open20):
+        return await correr_async(self._pasos_open(open20), self._post)
+
+    async def execute(self, low, high, close, date):
+        return await correr_async(self._pasos_execute(low, high, close, date), self._post)
+
+    async def set_portfolio(self, cash, portfolio):
+        return await correr_async(self._pasos_set_portfolio(cash, portfolio), self._post)
+
+    async def replay(self, opens, lows, highs, closes, dates, bloque=250):
+        """Como StrategyClient.replay."""
+        return await correr_async(self._pasos_replay(opens, lows, highs, closes, dates, bloque), self._post)
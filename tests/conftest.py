@@ -0,0 +1,39 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# El repositorio no es un paquete instalable: se importa desde la raíz, como simulate/
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from market.sourcePerDay import CAMPOS  # noqa: E402
+
+
+class FuenteFalsa:
+    """
+    Lo que SourcePerDay necesita de un Source (símbolos, eje de fechas, máscara y paneles),
+    con precios aleatorios reproducibles y sin descargar nada. Un símbolo empieza a cotizar
+    tarde y a otro le falta una vela, como en los datos reales.
+    """
+    def __init__(self, n=6, dias=120, semilla=5):
+        rng = np.random.default_rng(semilla)
+        fechas = pd.bdate_range("2020-01-01", periods=dias)
+        self.fecha_inicio = "2020-01-01"
+        self.symbols = [f"S{k}" for k in range(n)]
+        self.size = n
+        self.fechas_ns = fechas.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        self.valido = np.ones((n, dias), dtype=bool)
+        self.valido[1, :4] = False
+        self.valido[2, 5] = False
+        close = 100 + rng.standard_normal((n, dias)).cumsum(axis=1)
+        paneles = {"open": close + 0.1, "close": close, "high": close + 1, "low": close - 1,
+                   "volume": np.full((n, dias), 1000.0)}
+        for campo in CAMPOS:
+            setattr(self, "panel_" + campo, np.where(self.valido, paneles[campo], np.nan))
+
+
+@pytest.fixture
+def fuente():
+    return FuenteFalsa()
@@ -0,0 +1,87 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class EstrategiaStub:
+    """
+    Estrategia determinista con estado: las órdenes de cada open dependen del número de
+    días ya abiertos, así que repetir un día o saltarse uno cambia el resultado.
+    """
+    def __init__(self):
+        self.abiertos = 0
+        self.fechas = []
+
+    def open(self, opens):
+        self.abiertos += 1
+        clase = [(int(o * 100) + self.abiertos) % 3 for o in opens]
+        return {"programBuy": [{"id": i, "price": o * 0.995, "amount": 1000}
+                               for i, o in enumerate(opens) if clase[i] == 0],
+                "programSell": [{"id": i, "price": o * 1.003, "amount": 800}
+                                for i, o in enumerate(opens) if clase[i] == 1]}
+
+    def execute(self, fecha):
+        self.fechas.append(fecha)
+
+
+class ServidorStub:
+    """
+    Servidor local con la API de StrategyClient (/sessions, open, execute y, si `replay`,
+    /replay). Sin `replay` esa ruta responde 404, como un servidor antiguo.
+    """
+    def __init__(self, replay=True):
+        self.replay = replay
+        self.sesiones = {}
+        self.llamadas = []
+        self.servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._manejador())
+        self.url = f"http://127.0.0.1:{self.servidor.server_address[1]}"
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+    def _responder(self, ruta, datos):
+        partes = ruta.strip("/").split("/")
+        self.llamadas.append(partes[-1])
+        if partes == ["sessions"]:
+            session_id = str(len(self.sesiones) + 1)
+            self.sesiones[session_id] = EstrategiaStub()
+            return 200, {"session_id": session_id}
+        estrategia = self.sesiones.get(partes[1])
+        if estrategia is None:
+            return 404, {"detail": "Session not found"}
+        if partes[2] == "open":
+            return 200, estrategia.open(datos["open20"])
+        if partes[2] == "execute":
+            estrategia.execute(datos["date"])
+            return 200, {"success": True}
+        if partes[2] == "replay" and self.replay:
+            orders = []
+            for opens, fecha in zip(datos["open"], datos["dates"]):
+                orders.append(estrategia.open(opens))
+                estrategia.execute(fecha)
+            return 200, {"orders": orders}
+        return 404, {"detail": "Not Found"}
+
+    def _manejador(self):
+        stub = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # cabeceras y cuerpo van en dos escrituras
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, respuesta = stub._responder(self.path, json.loads(cuerpo or b"{}"))
+                datos = json.dumps(respuesta).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        return Manejador
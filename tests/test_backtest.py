@@ -0,0 +1,37 @@
+import numpy as np
+
+from market.backtest import backtest_matricial, matrices_ordenes
+from market.informe import InformeSilencioso
+from market.simulator import Simulator
+from market.sourcePerDay import SourcePerDay
+
+
+def test_backtest_matricial_igual_que_simulator(fuente):
+    sp = SourcePerDay(fuente)
+    simulator = Simulator(sp.symbols, informe=InformeSilencioso())
+    simulator.money = 10000
+    rng = np.random.default_rng(0)
+    flujo, curva = [], []
+    while True:
+        orders = {"programBuy": [], "programSell": []}
+        for i in range(sp.size):
+            r = rng.random()
+            if r < 0.3 or r > 0.85:
+                orders["programBuy"].append({"id": i, "price": sp.open[i] * 0.995, "amount": 1000})
+            if 0.3 < r < 0.5 or r > 0.85:
+                orders["programSell"].append({"id": i, "price": sp.open[i] * 1.003,
+                                              "amount": float(rng.integers(0, 3000))})
+        for order in orders["programBuy"]:
+            simulator.programBuy(order["id"], order["price"], order["amount"])
+        for order in orders["programSell"]:
+            simulator.programSell(order["id"], order["price"], order["amount"])
+        flujo.append(orders)
+        curva.append(simulator.execute(sp.low, sp.high, sp.close, sp.current))
+        if not sp.nextDay():
+            break
+
+    resultado = backtest_matricial(*matrices_ordenes(flujo, sp.size), sp.panel_low, sp.panel_high,
+                                   sp.panel_close, 10000)
+    np.testing.assert_allclose(resultado["tasacion"], curva)
+    np.testing.assert_array_equal(resultado["posiciones"][-1], simulator.stocks)
+    assert resultado["compras"].sum() > 0 and resultado["ventas"].sum() > 0
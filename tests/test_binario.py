@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from utils.binario import codificar, decodificar
+
+
+def payload():
+    rng = np.random.default_rng(3)
+    return {
+        "open": rng.random((3, 20)) * 100,
+        "dates": [20200101, 20200102, 20200103],
+        "portfolio": [0, 5, 0],
+        "cash": [2500.25],
+        "programBuy": [{"id": 1, "price": 99.5, "amount": 1000}, {"id": 4, "price": 12.25, "amount": 800}],
+        "programSell": [],
+        "date": "2020-01-03",
+        "bulk": True,
+    }
+
+
+def test_ida_y_vuelta_con_f8_es_exacta():
+    original = payload()
+    vuelta = decodificar(codificar(original))
+
+    np.testing.assert_array_equal(vuelta["open"], original["open"])
+    assert vuelta["open"].dtype == np.dtype("<f8")
+    assert vuelta["dates"].dtype == np.dtype("<i8")
+    np.testing.assert_array_equal(vuelta["dates"], original["dates"])
+    np.testing.assert_array_equal(vuelta["portfolio"], original["portfolio"])
+    np.testing.assert_array_equal(vuelta["cash"], original["cash"])
+    assert vuelta["programBuy"] == original["programBuy"]
+    # Lo que no es numérico va tal cual en la cabecera
+    assert vuelta["programSell"] == [] and vuelta["date"] == "2020-01-03" and vuelta["bulk"] is True
+    assert set(vuelta) == set(original)
+
+
+def test_f4_pierde_precision_pero_no_los_enteros():
+    original = payload()
+    vuelta = decodificar(codificar(original, dtype="<f4"))
+
+    assert vuelta["open"].dtype == np.dtype("<f4")
+    np.testing.assert_allclose(vuelta["open"], original["open"], rtol=1e-6)
+    np.testing.assert_array_equal(vuelta["dates"], original["dates"])
+    assert [x["id"] for x in vuelta["programBuy"]] == [1, 4]
+    assert [x["price"] for x in vuelta["programBuy"]] == pytest.approx([99.5, 12.25])
+
+
+def test_listas_devuelve_lo_mismo_que_json():
+    original = payload()
+    vuelta = decodificar(codificar(original), listas=True)
+
+    assert vuelta["open"] == original["open"].tolist()
+    assert vuelta["dates"] == original["dates"] and vuelta["cash"] == original["cash"]
+    assert all(isinstance(x, int) for x in vuelta["portfolio"])
@@ -0,0 +1,83 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from market.almacen import AlmacenIncremental
+from market.cache import CacheDisco, disk_cache
+
+
+def test_entrada_corrupta_se_descarta_y_se_borra(tmp_path):
+    cache = CacheDisco(str(tmp_path))
+    cache.escribir("a", {"x": np.arange(3)})
+    ruta = cache._ruta("a")
+    with open(ruta, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\x00")
+
+    assert cache.leer("a") == (False, None)
+    assert not os.path.exists(ruta)
+    assert cache.estadisticas()["corruptos"] == 1
+
+
+def test_fichero_sin_cabecera_no_se_carga(tmp_path):
+    cache = CacheDisco(str(tmp_path))
+    with open(cache._ruta("b"), "wb") as f:
+        f.write(b"cualquier cosa")
+
+    assert cache.leer("b") == (False, None)
+    assert not os.path.exists(cache._ruta("b"))
+
+
+def test_expulsa_las_menos_usadas_al_superar_el_presupuesto(tmp_path):
+    cache = CacheDisco(str(tmp_path), limite_bytes=3500)
+    for clave in "abc":
+        cache.escribir(clave, b"x" * 1000)
+    # "a" se usa después que "b": la menos usada es "b"
+    antes = time.time() - 10
+    os.utime(cache._ruta("a"), (antes, antes))
+    os.utime(cache._ruta("b"), (antes - 5, antes - 5))
+    assert cache.leer("a")[0]
+    cache.escribir("d", b"x" * 1000)
+
+    assert not os.path.exists(cache._ruta("b"))
+    assert all(os.path.exists(cache._ruta(clave)) for clave in "acd")
+    assert cache.tamano() <= 3500
+    assert cache.estadisticas()["expulsados"] == 1
+
+
+def test_caducadas_cuentan_como_fallo(tmp_path):
+    cache = CacheDisco(str(tmp_path), max_edad=60)
+    cache.escribir("a", 1)
+    assert cache.leer("a") == (True, 1)
+    assert cache.leer("a", max_edad=-1) == (False, None)
+    assert cache.estadisticas()["caducados"] == 1
+
+
+def test_disk_cache_no_repite_la_llamada(tmp_path):
+    cache = CacheDisco(str(tmp_path))
+    llamadas = []
+
+    @disk_cache(cache=cache, version="1")
+    def doble(x, factor=2):
+        llamadas.append(x)
+        return x * factor
+
+    assert doble(3) == doble(3) == doble(x=3, factor=2) == 6
+    assert doble(3, factor=3) == 9
+    assert llamadas == [3, 3]
+
+
+def test_almacen_de_velas_vuelve_a_pedir_una_entrada_corrupta(tmp_path):
+    almacen = AlmacenIncremental(str(tmp_path))
+    velas = pd.DataFrame({"Date": pd.bdate_range("2020-01-01", periods=5), "Close": 1.0})
+    entrada = almacen.fusionar("A", "1d", None, velas, "2020-01-01", "2020-01-08")
+    assert almacen.leer("A", "1d")["fin"] == entrada["fin"] == "2020-01-07"
+
+    ruta = almacen.cache._ruta(almacen._clave("A", "1d"))
+    with open(ruta, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\x00")
+    assert almacen.leer("A", "1d") is None
+    assert almacen.pendientes(None, "2020-01-01", "2020-01-08") == [("2020-01-01", "2020-01-08")]
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from market.checkpoint import cargar_checkpoint, guardar_checkpoint
+from market.informe import InformeSilencioso
+from market.simulator import Simulator, SimulatorMulti
+from market.sourcePerDay import SourcePerDay
+from market.vivo import EstadoVivo, avanzar
+from strategyClient import StrategyClient
+from servidor_stub import ServidorStub
+
+
+def nuevo_simulador(fuente, multi):
+    if multi:
+        return SimulatorMulti(fuente.symbols, 2, money=10000)
+    simulator = Simulator(fuente.symbols, informe=InformeSilencioso())
+    simulator.money = 10000
+    return simulator
+
+
+def simular(fuente, ruta=None, corte=None, multi=False):
+    """Órdenes aleatorias (de día y GTC) cada día; en `corte` se guarda y se reanuda desde cero."""
+    sp = SourcePerDay(fuente)
+    simulator = nuevo_simulador(fuente, multi)
+    rng = np.random.default_rng(0)
+    curva = []
+    while True:
+        for i in range(sp.size):
+            r = rng.random()
+            posicion = (1, i) if multi else (i,)
+            if r < 0.3:
+                simulator.programBuy(*posicion, sp.open[i] * 0.995, 1000, gtc=r < 0.1)
+            if 0.3 < r < 0.5:
+                simulator.programSell(*posicion, sp.open[i] * 1.003, float(rng.integers(0, 3000)), gtc=r > 0.45)
+        curva.append(simulator.execute(sp.low, sp.high, sp.close, sp.current))
+        if sp.dia == corte:
+            guardar_checkpoint(ruta, simulator=simulator.estado(), source=sp.estado())
+            checkpoint = cargar_checkpoint(ruta)
+            sp = SourcePerDay(fuente)
+            simulator = nuevo_simulador(fuente, multi)
+            simulator.restaurar(checkpoint["simulator"])
+            sp.restaurar(checkpoint["source"])
+        if not sp.nextDay():
+            break
+    return np.array(curva), simulator
+
+
+@pytest.mark.parametrize("multi", [False, True])
+def test_reanudar_igual_que_sin_interrumpir(fuente, tmp_path, multi):
+    curva, simulator = simular(fuente, multi=multi)
+    reanudada, reanudado = simular(fuente, tmp_path / "checkpoint.npz", corte=40, multi=multi)
+
+    np.testing.assert_array_equal(reanudada, curva)
+    np.testing.assert_array_equal(reanudado.stocks, simulator.stocks)
+    assert reanudado.libro.ejecuciones.n == simulator.libro.ejecuciones.n
+
+
+class Caida(Exception):
+    pass
+
+
+@pytest.mark.parametrize("bloque", [None, 30])
+def test_caida_con_peticion_en_vuelo_descarta_el_checkpoint(fuente, tmp_path, bloque):
+    servidor = ServidorStub()
+    try:
+        vivo = EstadoVivo(str(tmp_path / "vivo.npz"), {"money": 10000})
+        sp = SourcePerDay(fuente)
+        simulator = nuevo_simulador(fuente, False)
+        cliente = StrategyClient({"email": "", "key": ""}, api_url=servidor.url)
+        pedidos = []
+
+        def alPedir(desde, hasta):
+            vivo.pendiente(desde, hasta)
+            pedidos.append(desde)
+            # El proceso cae justo después de marcar la segunda petición
+            if len(pedidos) == 2:
+                raise Caida()
+
+        with pytest.raises(Caida):
+            avanzar(simulator, sp, cliente, bloque=bloque, alPedir=alPedir,
+                    alCerrarBloque=lambda tasacion: vivo.guardar(simulator, sp, cliente, tasacion))
+        # Hay un checkpoint del primer tramo, pero la sesión pudo recibir el segundo
+        assert cargar_checkpoint(vivo.ruta) is not None
+        assert vivo.restaurar(nuevo_simulador(fuente, False), SourcePerDay(fuente)) is None
+
+        # Un guardar posterior (la simulación repetida desde cero) borra la marca
+        sp = SourcePerDay(fuente)
+        vivo.guardar(nuevo_simulador(fuente, False), sp, cliente, 10000)
+        assert vivo.restaurar(nuevo_simulador(fuente, False), SourcePerDay(fuente)) is not None
+    finally:
+        servidor.cerrar()
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from market.descarga import DescargaParalela
+
+
+def respuesta(instrumentos, inicio, fin):
+    """DataFrame como el de yf.download(group_by="ticker") con una vela por día hábil."""
+    fechas = pd.bdate_range(inicio, fin, inclusive="left", name="Date")
+    partes = {t: pd.DataFrame({"Open": 1.0, "High": 2.0, "Low": 0.5, "Close": 1.5, "Volume": 10.0}, index=fechas)
+              for t in instrumentos}
+    return pd.concat(partes, axis=1, names=["Ticker", "Price"])
+
+
+def descarga(descargar, **kwargs):
+    return DescargaParalela(descargar, host="stub", peticiones_por_segundo=1000, espera=0,
+                            informar=lambda mensaje: None, **kwargs)
+
+
+def test_reintenta_solo_los_que_faltan_en_la_respuesta():
+    llamadas = []
+
+    def descargar(instrumentos, inicio, fin, intervalo):
+        llamadas.append(tuple(instrumentos))
+        # La primera respuesta llega sin B, como hace Yahoo con algunos tickers
+        presentes = [t for t in instrumentos if t != "B" or len(llamadas) > 1]
+        return respuesta(presentes, inicio, fin)
+
+    d = descarga(descargar, lote=3, hilos=1)
+    partes = d.ejecutar(["A", "B", "C"], [("2020-01-01", "2020-02-01")], "1d")
+
+    assert sorted(partes) == ["A", "B", "C"]
+    assert llamadas == [("A", "B", "C"), ("B",)]
+    assert d.fallidos == []
+
+
+def test_los_que_nunca_llegan_quedan_en_fallidos():
+    llamadas = []
+
+    def descargar(instrumentos, inicio, fin, intervalo):
+        llamadas.append(tuple(instrumentos))
+        return respuesta([t for t in instrumentos if t != "MALO"], inicio, fin)
+
+    d = descarga(descargar, lote=2, hilos=2, reintentos=2)
+    partes = d.ejecutar(["A", "MALO", "C"], [("2020-01-01", "2020-01-15"), ("2020-01-15", "2020-02-01")], "1d")
+
+    assert sorted(partes) == ["A", "C"]
+    assert all(len(bloques) == 2 for bloques in partes.values())
+    assert sorted((tuple(lote), bloque) for lote, bloque, _ in d.fallidos) == \
+        [(("MALO",), ("2020-01-01", "2020-01-15")), (("MALO",), ("2020-01-15", "2020-02-01"))]
+    # Por bloque: la petición del lote y dos reintentos solo de MALO
+    assert llamadas.count(("MALO",)) == 4
+
+
+def test_un_error_se_reintenta_y_el_ultimo_queda_en_fallidos():
+    intentos = []
+
+    def descargar(instrumentos, inicio, fin, intervalo):
+        intentos.append(tuple(instrumentos))
+        if instrumentos == ["X"]:
+            raise IOError("sin conexión")
+        if len(intentos) == 1:
+            raise IOError("timeout")
+        return respuesta(instrumentos, inicio, fin)
+
+    d = descarga(descargar, lote=1, hilos=1, reintentos=1)
+    partes = d.ejecutar(["A", "X"], [("2020-01-01", "2020-02-01")], "1d")
+
+    assert list(partes) == ["A"]
+    assert [(lote, str(error)) for lote, _, error in d.fallidos] == [(["X"], "sin conexión")]
@@ -0,0 +1,80 @@
+import copy
+
+import numpy as np
+import pytest
+
+from conftest import FuenteFalsa
+from market.informe import InformeSilencioso
+from market.simulator import Simulator
+from market.sourcePerDay import CAMPOS, SourcePerDay
+from market.vivo import avanzar
+from strategyClient import StrategyClientGrabado
+from servidor_stub import ServidorStub
+
+SIN_RED = "http://127.0.0.1:9"
+CONFIG = {"email": "", "key": "", "money": 10000}
+
+
+@pytest.fixture
+def servidor():
+    # Sin /replay: la grabación queda día a día y vale para cualquier tamaño de bloque
+    servidor = ServidorStub(replay=False)
+    yield servidor
+    servidor.cerrar()
+
+
+def recortar(fuente, dias):
+    """Los primeros `dias` de la fuente, como si se hubiese descargado antes."""
+    corta = copy.copy(fuente)
+    corta.fechas_ns = fuente.fechas_ns[:dias]
+    corta.valido = fuente.valido[:, :dias]
+    for campo in CAMPOS:
+        setattr(corta, "panel_" + campo, getattr(fuente, "panel_" + campo)[:, :dias])
+    return corta
+
+
+def simular(fuente, archivo, modo, api_url, bloque=None):
+    sp = SourcePerDay(fuente)
+    simulator = Simulator(sp.symbols, informe=InformeSilencioso())
+    simulator.money = 10000
+    cliente = StrategyClientGrabado(CONFIG, archivo=str(archivo), modo=modo, api_url=api_url)
+    curva = []
+    avanzar(simulator, sp, cliente, alCerrarDia=curva.append, bloque=bloque)
+    return np.array(curva), cliente
+
+
+def test_reproducir_sin_red_da_lo_mismo_que_grabar(fuente, tmp_path, servidor):
+    archivo = tmp_path / "respuestas.jsonl"
+    curva, _ = simular(fuente, archivo, "grabar", servidor.url)
+    llamadas = len(servidor.llamadas)
+
+    for bloque in (None, 30):
+        reproducida, cliente = simular(fuente, archivo, "reproducir", SIN_RED, bloque)
+        np.testing.assert_array_equal(reproducida, curva)
+        assert not cliente.conectado
+    assert len(servidor.llamadas) == llamadas
+    # Una petición que no está grabada (otros precios) no se inventa
+    with pytest.raises(KeyError):
+        simular(FuenteFalsa(semilla=6), archivo, "reproducir", SIN_RED)
+
+
+def test_auto_sigue_contra_el_servidor_donde_acaba_la_grabacion(fuente, tmp_path, servidor):
+    archivo = tmp_path / "respuestas.jsonl"
+    simular(recortar(fuente, 80), archivo, "grabar", servidor.url)
+    directa, _ = simular(fuente, tmp_path / "otra.jsonl", "grabar", servidor.url)
+
+    servidor.llamadas.clear()
+    curva, cliente = simular(fuente, archivo, "auto", servidor.url)
+
+    np.testing.assert_array_equal(curva, directa)
+    assert cliente.conectado
+    # La sesión nueva recibe primero lo servido desde el fichero y después el resto
+    assert servidor.sesiones[cliente.session_id].fechas == list(servidor.sesiones.values())[1].fechas
+    assert servidor.llamadas.count("sessions") == 1
+    assert servidor.llamadas.count("open") == curva.size
+
+    # Lo que se ha pedido al servidor queda grabado: otra ejecución ya no sale a la red
+    servidor.llamadas.clear()
+    repetida, cliente = simular(fuente, archivo, "auto", servidor.url)
+    np.testing.assert_array_equal(repetida, directa)
+    assert not cliente.conectado and servidor.llamadas == []
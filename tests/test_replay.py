@@ -0,0 +1,91 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from market.informe import InformeSilencioso
+from market.simulator import Simulator
+from market.sourcePerDay import SourcePerDay
+from market.vivo import avanzar, avanzar_async
+from strategyClient import StrategyClient
+from utils.instrumentacion import MetricasCliente
+from servidor_stub import ServidorStub
+
+
+@pytest.fixture
+def servidores():
+    abiertos = []
+
+    def crear(replay=True):
+        abiertos.append(ServidorStub(replay))
+        return abiertos[-1]
+
+    yield crear
+    for servidor in abiertos:
+        servidor.cerrar()
+
+
+def simular(fuente, servidor, bloque):
+    sp = SourcePerDay(fuente)
+    simulator = Simulator(sp.symbols, informe=InformeSilencioso())
+    simulator.money = 10000
+    cliente = StrategyClient({"email": "", "key": ""}, api_url=servidor.url)
+    curva = []
+    avanzar(simulator, sp, cliente, alCerrarDia=curva.append, bloque=bloque)
+    return np.array(curva), simulator, cliente
+
+
+def test_replay_en_bloques_igual_que_dia_a_dia(fuente, servidores):
+    por_dia = servidores()
+    curva, simulator, _ = simular(fuente, por_dia, None)
+    en_bloque = servidores()
+    curva_bloque, simulator_bloque, cliente = simular(fuente, en_bloque, 50)
+
+    np.testing.assert_array_equal(curva_bloque, curva)
+    np.testing.assert_array_equal(simulator_bloque.stocks, simulator.stocks)
+    assert cliente.bulk
+    # La sesión remota ve los mismos días en el mismo orden
+    assert en_bloque.sesiones[cliente.session_id].fechas == list(por_dia.sesiones.values())[0].fechas
+    dias = curva.size
+    assert en_bloque.llamadas.count("replay") == -(-dias // 50)
+    assert "open" not in en_bloque.llamadas and por_dia.llamadas.count("open") == dias
+
+
+def test_replay_sin_ruta_vuelve_a_dia_a_dia(fuente, servidores):
+    curva, simulator, _ = simular(fuente, servidores(), None)
+    antiguo = servidores(replay=False)
+    curva_antiguo, simulator_antiguo, cliente = simular(fuente, antiguo, 50)
+
+    np.testing.assert_array_equal(curva_antiguo, curva)
+    np.testing.assert_array_equal(simulator_antiguo.stocks, simulator.stocks)
+    # Se prueba /replay una sola vez y después se sigue con open/execute
+    assert not cliente.bulk
+    assert antiguo.llamadas.count("replay") == 1
+    assert antiguo.llamadas.count("open") == curva.size
+
+
+def test_cliente_asincrono_igual_que_el_sincrono_y_con_metricas(fuente, servidores):
+    pytest.importorskip("httpx")
+    from strategyClientAsync import StrategyClientAsync, cliente_compartido
+
+    curva, simulator, _ = simular(fuente, servidores(), None)
+    servidor = servidores()
+    metricas = MetricasCliente()
+
+    async def correr():
+        async with cliente_compartido() as cliente:
+            sesion = await StrategyClientAsync.crear({"email": "", "key": ""}, api_url=servidor.url,
+                                                     cliente=cliente, metricas=metricas)
+            simulator_async = Simulator(fuente.symbols, informe=InformeSilencioso())
+            simulator_async.money = 10000
+            curva_async = []
+            await avanzar_async(simulator_async, SourcePerDay(fuente), [sesion], alCerrarDia=curva_async.append)
+            return np.array(curva_async), simulator_async
+
+    curva_async, simulator_async = asyncio.run(correr())
+    np.testing.assert_array_equal(curva_async, curva)
+    np.testing.assert_array_equal(simulator_async.stocks, simulator.stocks)
+    endpoints = metricas.como_dict()
+    assert endpoints["sessions"]["peticiones"] == 1
+    assert endpoints["open"]["peticiones"] == endpoints["execute"]["peticiones"] == curva.size
+    assert endpoints["open"]["bytes_enviados"] > 0 and endpoints["open"]["bytes_recibidos"] > 0
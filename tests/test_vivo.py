@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from conftest import FuenteFalsa
+from market.informe import InformeSilencioso
+from market.simulator import Simulator
+from market.sourcePerDay import SourcePerDay
+from market.vivo import EstadoVivo
+
+
+class Sesion:
+    def estado(self):
+        return {"session_id": "1"}
+
+
+def nuevo_simulador(fuente):
+    simulator = Simulator(fuente.symbols, informe=InformeSilencioso())
+    simulator.money = 10000
+    return simulator
+
+
+def test_guarda_las_ordenes_y_la_fecha_del_open(fuente, tmp_path):
+    vivo = EstadoVivo(str(tmp_path / "vivo.npz"), {"money": 10000})
+    sp = SourcePerDay(fuente)
+    sp.nextDay()
+    ordenes = {"programBuy": [{"id": np.int64(2), "price": 101.5, "amount": 1000}], "programSell": []}
+    vivo.guardar(nuevo_simulador(fuente), sp, Sesion(), 10000, abierto=True, ordenes=ordenes,
+                 fecha_open="2020-06-17")
+
+    restaurado = vivo.restaurar(nuevo_simulador(fuente), SourcePerDay(fuente))
+    assert restaurado["abierto"] and restaurado["fecha_open"] == "2020-06-17"
+    assert restaurado["ordenes"] == {"programBuy": [{"id": 2, "price": 101.5, "amount": 1000}], "programSell": []}
+
+    vivo.guardar(nuevo_simulador(fuente), sp, Sesion(), 10000)
+    restaurado = vivo.restaurar(nuevo_simulador(fuente), SourcePerDay(fuente))
+    assert not restaurado["abierto"] and restaurado["fecha_open"] is None
+
+
+def test_checkpoint_de_otro_universo_se_descarta(fuente, tmp_path):
+    vivo = EstadoVivo(str(tmp_path / "vivo.npz"), {"money": 10000})
+    sp = SourcePerDay(fuente)
+    sp.nextDay()
+    vivo.guardar(nuevo_simulador(fuente), sp, Sesion(), 10000)
+
+    otra = FuenteFalsa(n=4)
+    sp_otra = SourcePerDay(otra)
+    assert vivo.restaurar(nuevo_simulador(otra), sp_otra) is None
+    assert sp_otra.dia == 0
+
+
+def test_sincronizar_toma_la_cartera_del_broker(fuente):
+    simulator = nuevo_simulador(fuente)
+    simulator.sincronizar(2500.5, [0, 3, 0, 0, 7.0, 0])
+    assert simulator.money == 2500.5
+    np.testing.assert_array_equal(simulator.stocks, [0, 3, 0, 0, 7, 0])
+    with pytest.raises(ValueError):
+        simulator.sincronizar(0, [1, 2])
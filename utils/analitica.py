@@ -0,0 +1,106 @@
+import numpy as np
+
+# Métricas de rendimiento sobre curvas de valoración. Todas aceptan arrays (..., T), con el
+# tiempo en el último eje, y devuelven una métrica por curva: sirven igual para una
+# simulación que para miles de curvas de un barrido (p. ej. InformeRegistro.curva().T).
+
+NS_DIA = 86400 * 10**9
+
+
+def dias(fechas):
+    """Días naturales cubiertos por las fechas (ns o datetime64), contando el primero."""
+    fechas = np.asarray(fechas).astype("datetime64[ns]").astype(np.int64)
+    return (fechas[..., -1] - fechas[..., 0]) / NS_DIA + 1
+
+
+def tae(final, inicial, dias):
+    """Tasa anual equivalente (CAGR) de pasar de `inicial` a `final` en `dias` días naturales."""
+    return (np.asarray(final, dtype=np.float64) / inicial) ** (365 / np.asarray(dias, dtype=np.float64)) - 1
+
+
+def tae_curva(curva, dias):
+    curva = np.asarray(curva, dtype=np.float64)
+    return tae(curva[..., -1], curva[..., 0], dias)
+
+
+def rendimientos(curva):
+    """Rendimientos simples por barra, (..., T-1)."""
+    curva = np.asarray(curva, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.diff(curva, axis=-1) / curva[..., :-1]
+
+
+def drawdown(curva):
+    """Serie de drawdown respecto al máximo anterior (valores <= 0)."""
+    curva = np.asarray(curva, dtype=np.float64)
+    return curva / np.maximum.accumulate(curva, axis=-1) - 1
+
+
+def max_drawdown(curva):
+    """Mayor caída desde un máximo, como fracción positiva."""
+    return -np.min(drawdown(curva), axis=-1)
+
+
+def drawdown_movil(curva, ventana):
+    """Drawdown respecto al máximo de las últimas `ventana` barras, (..., T)."""
+    curva = np.asarray(curva, dtype=np.float64)
+    relleno = np.concatenate([np.repeat(curva[..., :1], ventana - 1, axis=-1), curva], axis=-1)
+    maximos = np.lib.stride_tricks.sliding_window_view(relleno, ventana, axis=-1).max(axis=-1)
+    return curva / maximos - 1
+
+
+def sharpe(curva, periodos=252, libre=0.0):
+    """Sharpe anualizado de los rendimientos por barra; `libre` es el tipo anual sin riesgo."""
+    exceso = rendimientos(curva) - libre / periodos
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.mean(exceso, axis=-1) / np.std(exceso, axis=-1, ddof=1) * np.sqrt(periodos)
+
+
+def sortino(curva, periodos=252, libre=0.0):
+    """Como sharpe, pero dividiendo por la desviación de los rendimientos negativos."""
+    exceso = rendimientos(curva) - libre / periodos
+    bajista = np.sqrt(np.mean(np.minimum(exceso, 0) ** 2, axis=-1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.mean(exceso, axis=-1) / bajista * np.sqrt(periodos)
+
+
+def rotacion(negociado, curva, periodos=252):
+    """Rotación anual: nominal negociado por barra sobre la valoración, anualizado."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.mean(np.asarray(negociado, dtype=np.float64) / curva, axis=-1) * periodos
+
+
+def exposicion(invertido, curva):
+    """Fracción media de la valoración invertida en acciones."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.mean(np.asarray(invertido, dtype=np.float64) / curva, axis=-1)
+
+
+def arrastre_comisiones(curva, comision, dias):
+    """TAE perdida por comisiones: la de la curva sin pagarlas menos la real."""
+    curva = np.asarray(curva, dtype=np.float64)
+    sin_comisiones = curva + np.cumsum(comision, axis=-1)
+    return tae_curva(sin_comisiones, dias) - tae_curva(curva, dias)
+
+
+def metricas(curva, fechas=None, comision=None, invertido=None, negociado=None, periodos=252):
+    """
+    Todas las métricas disponibles de una o varias curvas (..., T) en un dict.
+    Sin `fechas` los días naturales se estiman como T*365/periodos.
+    """
+    curva = np.asarray(curva, dtype=np.float64)
+    n = dias(fechas) if fechas is not None else curva.shape[-1] * 365 / periodos
+    resultado = {
+        "tae": tae_curva(curva, n),
+        "rentabilidad_total": curva[..., -1] / curva[..., 0] - 1,
+        "max_drawdown": max_drawdown(curva),
+        "sharpe": sharpe(curva, periodos),
+        "sortino": sortino(curva, periodos),
+    }
+    if comision is not None:
+        resultado["arrastre_comisiones"] = arrastre_comisiones(curva, comision, n)
+    if invertido is not None:
+        resultado["exposicion"] = exposicion(invertido, curva)
+    if negociado is not None:
+        resultado["rotacion"] = rotacion(negociado, curva, periodos)
+    return resultado
@@ -0,0 +1,69 @@
+import json
+import struct
+import zlib
+
+import numpy as np
+
+# Formato binario compacto para los payloads de StrategyClient:
+#   4 bytes little-endian con la longitud de la cabecera, cabecera JSON y, comprimidos con
+#   zlib, los bytes de todos los arrays seguidos. La cabecera describe cada array (nombre,
+#   dtype little-endian y forma) y lleva tal cual el resto de campos que no son numéricos.
+# Los campos que son listas de registros numéricos ({"id", "price", "amount"}) se guardan por
+# columnas con nombre "campo.columna" y se rehacen como lista de dicts al decodificar.
+
+CONTENT_TYPE = "application/x-pyro-arrays"
+
+
+def _es_numerico(valor):
+    return isinstance(valor, np.ndarray) and valor.dtype.kind in "iuf" or \
+        isinstance(valor, (list, tuple)) and len(valor) > 0 and \
+        all(isinstance(x, (int, float, np.number)) and not isinstance(x, bool) for x in np.ravel(np.asarray(valor, dtype=object)))
+
+
+def _es_registros(valor):
+    return isinstance(valor, list) and all(isinstance(x, dict) for x in valor) and \
+        all(set(x) == set(valor[0]) and all(_es_numerico([v]) for v in x.values()) for x in valor)
+
+
+def codificar(payload, dtype="<f8", nivel=1):
+    """dict -> bytes. Los floats van con `dtype` ("<f8" o "<f4"); los enteros como "<i8"."""
+    arrays, campos, registros = [], {}, {}
+    for nombre, valor in payload.items():
+        if _es_numerico(valor):
+            arrays.append((nombre, np.asarray(valor)))
+        elif _es_registros(valor) and valor:
+            registros[nombre] = list(valor[0])
+            for columna in valor[0]:
+                arrays.append((f"{nombre}.{columna}", np.array([x[columna] for x in valor])))
+        else:
+            campos[nombre] = valor
+    descripcion, datos = [], []
+    for nombre, array in arrays:
+        array = array.astype("<i8" if array.dtype.kind in "iu" else dtype)
+        descripcion.append({"nombre": nombre, "dtype": array.dtype.str, "forma": list(array.shape)})
+        datos.append(array.tobytes())
+    cabecera = json.dumps({"arrays": descripcion, "registros": registros, "campos": campos}).encode()
+    return struct.pack("<I", len(cabecera)) + cabecera + zlib.compress(b"".join(datos), nivel)
+
+
+def decodificar(datos, listas=False):
+    """bytes -> dict con arrays numpy (o listas si `listas`) y los registros como lista de dicts."""
+    n, = struct.unpack_from("<I", datos)
+    cabecera = json.loads(datos[4:4 + n])
+    cuerpo = zlib.decompress(datos[4 + n:])
+    resultado = dict(cabecera["campos"])
+    columnas = {}
+    posicion = 0
+    for array in cabecera["arrays"]:
+        dtype = np.dtype(array["dtype"])
+        tamano = int(np.prod(array["forma"], dtype=np.int64)) * dtype.itemsize
+        valor = np.frombuffer(cuerpo, dtype=dtype, count=tamano // dtype.itemsize, offset=posicion).reshape(array["forma"])
+        posicion += tamano
+        if "." in array["nombre"] and array["nombre"].split(".", 1)[0] in cabecera["registros"]:
+            columnas[array["nombre"]] = valor.tolist()
+        else:
+            resultado[array["nombre"]] = valor.tolist() if listas else valor
+    for nombre, claves in cabecera["registros"].items():
+        valores = [columnas[f"{nombre}.{clave}"] for clave in claves]
+        resultado[nombre] = [dict(zip(claves, fila)) for fila in zip(*valores)]
+    return resultado
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+# Grabación de respuestas de StrategyClient para repetir backtests sin red.
+# Cada petición se identifica por una huella encadenada: sha256 de la huella anterior, la ruta
+# y el payload, partiendo de la configuración de la sesión. Así la clave depende de toda la
+# historia de la sesión, igual que la respuesta del servidor.
+
+MODOS = ("auto", "grabar", "reproducir")
+OMITIDOS = ("key", "email")  # credenciales: no cambian las respuestas
+
+
+def _a_json(valor):
+    return valor.tolist() if hasattr(valor, "tolist") else str(valor)
+
+
+def huella_config(config):
+    limpia = {k: v for k, v in config.items() if k not in OMITIDOS}
+    return hashlib.sha256(json.dumps(limpia, sort_keys=True, default=_a_json).encode()).hexdigest()
+
+
+def huella(anterior, ruta, payload):
+    """Huella de una petición a partir de la anterior; los arrays se resumen por sus bytes."""
+    h = hashlib.sha256(anterior.encode())
+    h.update(ruta.encode())
+    for clave in sorted(payload):
+        valor = payload[clave]
+        h.update(clave.encode())
+        if isinstance(valor, np.ndarray) or isinstance(valor, (list, tuple)) and valor and \
+                isinstance(valor[0], (float, int, np.number, list, np.ndarray)):
+            array = np.ascontiguousarray(valor, dtype=np.float64)
+            h.update(str(array.shape).encode())
+            h.update(array.tobytes())
+        else:
+            h.update(json.dumps(valor, sort_keys=True, default=_a_json).encode())
+    return h.hexdigest()
+
+
+class RegistroRespuestas:
+    """
+    Fichero JSONL de solo añadir: una línea {"clave", "ruta", "respuesta"} por petición grabada.
+    Se carga entero al abrirlo; las líneas nuevas se añaden al final y se vuelcan al momento,
+    de modo que una ejecución interrumpida conserva lo grabado hasta entonces.
+    """
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.respuestas = {}
+        self.lock = threading.Lock()
+        if os.path.exists(archivo):
+            with open(archivo, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        registro = json.loads(linea)
+                    except json.JSONDecodeError:
+                        continue  # última línea a medias de una ejecución cortada
+                    self.respuestas[registro["clave"]] = registro["respuesta"]
+
+    def buscar(self, clave):
+        return self.respuestas.get(clave)
+
+    def agregar(self, clave, ruta, respuesta):
+        linea = json.dumps({"clave": clave, "ruta": ruta, "respuesta": respuesta}, default=_a_json)
+        with self.lock:
+            os.makedirs(os.path.dirname(self.archivo) or ".", exist_ok=True)
+            with open(self.archivo, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+            self.respuestas[clave] = respuesta
+
+
+class RespuestaGrabada:
+    """Lo mínimo de requests.Response que usa StrategyClient, para respuestas sacadas del registro."""
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, datos, status_code=200):
+        self.datos = datos
+        self.status_code = status_code
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise KeyError(f"Sin respuesta grabada (status {self.status_code})")
+
+    def json(self):
+        return self.datos
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Métricas de las llamadas de StrategyClient: por endpoint, histogramas de tiempos (conexión,
+# primer byte y total), bytes enviados/recibidos y reintentos del Retry del adaptador.
+
+_ultima = threading.local()  # segundos de la última conexión abierta en este hilo
+
+
+def _medir_conexion(clase):
+    class Medida(clase):
+        def connect(self):
+            inicio = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                _ultima.conexion = getattr(_ultima, "conexion", 0.0) + time.perf_counter() - inicio
+    Medida.__name__ = "Medida" + clase.__name__
+    return Medida
+
+
+class _PiscinaHTTP(HTTPConnectionPool):
+    ConnectionCls = _medir_conexion(HTTPConnection)
+
+
+class _PiscinaHTTPS(HTTPSConnectionPool):
+    ConnectionCls = _medir_conexion(HTTPSConnection)
+
+
+class AdaptadorMedido(HTTPAdapter):
+    """HTTPAdapter cuyas conexiones anotan cuánto tardan en abrirse (TCP + TLS)."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _PiscinaHTTP, "https": _PiscinaHTTPS}
+
+
+def reiniciar_conexion():
+    _ultima.conexion = 0.0
+
+
+def tiempo_conexion():
+    """Tiempo de conexión acumulado en este hilo desde reiniciar_conexion() (0 si se reutilizó)."""
+    return getattr(_ultima, "conexion", 0.0)
+
+
+class Histograma:
+    """Histograma de tiempos con cubetas logarítmicas de 0.1 ms a 100 s."""
+    BORDES = np.logspace(-4, 2, 61)
+
+    def __init__(self):
+        self.cuentas = np.zeros(self.BORDES.size + 1, dtype=np.int64)
+        self.n = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, segundos):
+        self.cuentas[np.searchsorted(self.BORDES, segundos)] += 1
+        self.n += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, q):
+        """Borde superior de la cubeta donde cae el percentil q (0-100)."""
+        if self.n == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.cuentas), q / 100 * self.n))
+        return float(self.BORDES[min(i, self.BORDES.size - 1)]) if i < self.BORDES.size else self.maximo
+
+    def media(self):
+        return self.suma / self.n if self.n else 0.0
+
+    def como_dict(self):
+        return {"n": self.n, "media": self.media(), "p50": self.percentil(50), "p90": self.percentil(90),
+                "p99": self.percentil(99), "max": self.maximo, "bordes": self.BORDES.tolist(),
+                "cuentas": self.cuentas.tolist()}
+
+
+class MetricasCliente:
+    """Acumula una fila por petición agrupada por endpoint."""
+    TIEMPOS = ("conexion", "ttfb", "total")
+
+    def __init__(self):
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def _endpoint(self, nombre):
+        if nombre not in self.endpoints:
+            self.endpoints[nombre] = {"tiempos": {t: Histograma() for t in self.TIEMPOS},
+                                      "peticiones": 0, "errores": 0, "reintentos": 0,
+                                      "bytes_enviados": 0, "bytes_recibidos": 0}
+        return self.endpoints[nombre]
+
+    def registrar(self, endpoint, conexion, ttfb, total, enviados, recibidos, reintentos=0, status=200):
+        with self.lock:
+            e = self._endpoint(endpoint)
+            for nombre, valor in zip(self.TIEMPOS, (conexion, ttfb, total)):
+                e["tiempos"][nombre].agregar(valor)
+            e["peticiones"] += 1
+            e["errores"] += status >= 400
+            e["reintentos"] += reintentos
+            e["bytes_enviados"] += enviados
+            e["bytes_recibidos"] += recibidos
+
+    def resumen(self):
+        """Tabla de texto con una línea por endpoint (tiempos en ms)."""
+        lineas = [f"{'endpoint':<14}{'n':>7}{'err':>5}{'retry':>6}{'conexión':>10}{'ttfb p50':>10}"
+                  f"{'ttfb p99':>10}{'total':>10}{'tiempo':>9}{'KB env':>9}{'KB rec':>9}"]
+        for nombre, e in sorted(self.endpoints.items()):
+            t = e["tiempos"]
+            lineas.append(f"{nombre:<14}{e['peticiones']:>7}{e['errores']:>5}{e['reintentos']:>6}"
+                          f"{t['conexion'].media()*1000:>10.1f}{t['ttfb'].percentil(50)*1000:>10.1f}"
+                          f"{t['ttfb'].percentil(99)*1000:>10.1f}{t['total'].media()*1000:>10.1f}"
+                          f"{t['total'].suma:>8.1f}s{e['bytes_enviados']/1024:>9.0f}{e['bytes_recibidos']/1024:>9.0f}")
+        return "\n".join(lineas)
+
+    def como_dict(self):
+        return {nombre: dict(e, tiempos={t: h.como_dict() for t, h in e["tiempos"].items()})
+                for nombre, e in self.endpoints.items()}
+
+    def exportar(self, ruta):
+        """Escribe las métricas como JSON (se sobrescribe el fichero)."""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(self.como_dict(), f, indent=1)
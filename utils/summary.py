@@ -5,6 +5,7 @@ from scipy.stats import norm
 import numpy as np
 import csv
 from datetime import datetime
+from utils import analitica
 
 def paint_graphs(csv_path: str):
     print("📥 Iniciando generación de gráficos...")
@@ -146,7 +147,7 @@ def save_resume(simulator, sp, tasacion, p, archivo= None):
     dinero_inicial = simulator.initialMoney
     dinero_final = tasacion
     dias = (sp.current - simulator.initialDate).days + 1
-    tae = (dinero_final / dinero_inicial) ** (365 / dias) - 1
+    tae = float(analitica.tae(dinero_final, dinero_inicial, dias))
     rentabilidad_total = dinero_final / dinero_inicial - 1
 
     headers = [